@@ -0,0 +1,68 @@
+'''
+Compare how much memory NetflixTitle and CompactTitle use per title.
+
+    python benchmarks/title_memory.py [number of titles]
+'''
+import sys
+import json
+
+from flixpy.title import NetflixTitle
+from flixpy.compact import CompactTitle
+
+HOST = 'http://api-public.netflix.com'
+
+def raw_title(number):
+    # roughly what a title in the streaming catalog looks like
+    url = '%s/catalog/titles/movies/%s' % (HOST, 60000000 + number)
+    return {
+        'id': url,
+        'title': {'regular': u'Title number %s' % number, 'short': u'Title %s' % number},
+        'box_art': dict((size, 'http://cdn-0.nflximg.com/images/%s/%s.jpg' % (size, number)) for size in ('small', 'medium', 'large')),
+        'release_year': 2000 + number % 13,
+        'average_rating': 3.5,
+        'synopsis': {'regular': u'A synopsis for title %s that goes on for a little while, like they do.' % number},
+        'delivery_formats': {'instant': {'quality': 'HD', 'runtime': 5400 + number % 600, 'mpaa_ratings': 'PG-13'}},
+        'links': [{'href': '%s/%s' % (url, rel), 'rel': rel} for rel in ('synopsis', 'cast', 'directors', 'similars', 'format_availability')],
+    }
+
+def deep_size(obj, seen):
+    '''
+    bytes used by obj and everything it refers to, counting shared objects once
+    '''
+    if id(obj) in seen or obj is None or isinstance(obj, (bool, type)):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif hasattr(type(obj), '__slots__'):
+        size += sum(deep_size(getattr(obj, slot), seen) for slot in type(obj).__slots__ if slot != 'client')
+    elif isinstance(obj, NetflixTitle):
+        # the instance dict itself, plus everything in it but the (shared) client
+        size += sys.getsizeof(obj.__dict__)
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.__dict__.items() if key != 'client')
+
+    return size
+
+def main(count):
+    # decode each title from json, like it would come off the wire
+    raw = [json.loads(json.dumps(raw_title(i))) for i in range(count)]
+
+    full = [NetflixTitle(title, None) for title in raw]
+    full_size = deep_size(full, set())
+
+    compact = [CompactTitle.from_title(title) for title in full]
+    del full, raw
+    compact_size = deep_size(compact, set())
+
+    print 'titles:       %s' % count
+    print 'NetflixTitle: %6.0f bytes per title' % (float(full_size) / count)
+    print 'CompactTitle: %6.0f bytes per title' % (float(compact_size) / count)
+    print 'reduction:    %5.1fx' % (float(full_size) / compact_size)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
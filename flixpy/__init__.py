@@ -1,2 +1,11 @@
 from flixpy.client import NetflixClient
 from flixpy.catalog import NetflixCatalog
+from flixpy.session import create_session
+from flixpy.cache import ResponseCache
+from flixpy.async_client import AsyncNetflixClient
+from flixpy.scheduler import RequestScheduler, INTERACTIVE, BACKGROUND
+from flixpy.hedge import Hedger
+from flixpy.metrics import ClientMetrics
+from flixpy.graph import CastGraph
+from flixpy.similars import SimilarsIndex
+from flixpy.exceptions import DeadlineExceeded, QuotaExceeded, OfflineAccessError
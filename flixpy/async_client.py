@@ -0,0 +1,56 @@
+from multiprocessing.pool import ThreadPool
+
+from .client import NetflixClient
+
+class AsyncNetflixClient(NetflixClient):
+    '''
+    A NetflixClient that can run requests in the background.
+
+    Every *_async method returns right away with an AsyncResult. Call
+    `.get()` on it to wait for (and get) the result, or `.ready()` to check if
+    it has finished. This makes it easy to fire off hundreds of lookups and
+    collect them afterwards:
+
+        pending = [netflix.catalog.search_async(term) for term in terms]
+        results = [p.get() for p in pending]
+
+    At most `max_concurrency` requests are in flight at once, the rest wait
+    their turn. Requests are signed exactly like NetflixClient signs them, and
+    the blocking NetflixClient methods all still work. The client is thread
+    safe (see NetflixClient's thread_safe) unless you pass thread_safe=False.
+    '''
+    def __init__(self, *args, **kwargs):
+        max_concurrency = kwargs.pop('max_concurrency', 10)
+
+        # keep a pooled connection around for every request that can be in flight
+        kwargs.setdefault('pool_maxsize', max_concurrency)
+
+        # the *_async calls run on worker threads, so shared state needs locking
+        kwargs.setdefault('thread_safe', True)
+
+        super(AsyncNetflixClient, self).__init__(*args, **kwargs)
+
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPool(max_concurrency)
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        run func(*args, **kwargs) in the background, returning an AsyncResult
+        '''
+        return self._pool.apply_async(self._carry_context(func), args, kwargs)
+
+    def close(self):
+        '''
+        wait for any running requests to finish, then shut down the worker threads
+        '''
+        self._pool.close()
+        self._pool.join()
+
+    def get_resource_async(self, url, params=None, expand=None, **kwargs):
+        return self.submit(self.get_resource, url, params, expand, **kwargs)
+
+    def post_resource_async(self, url, params=None, data=None, **kwargs):
+        return self.submit(self.post_resource, url, params, data, **kwargs)
+
+    def delete_resource_async(self, url, params=None, **kwargs):
+        return self.submit(self.delete_resource, url, params, **kwargs)
@@ -1,21 +1,145 @@
+import sys
 import logging
 
+from .exceptions import OfflineAccessError
+from .utils import resource_id
+
 log = logging.getLogger('flixpy.base')
 
+def _merge_missing(data, new):
+    '''
+    add the keys in `new` that `data` doesn't have, going into nested dicts
+    '''
+    for key, value in new.items():
+        if key not in data:
+            data[key] = value
+        elif isinstance(data[key], dict) and isinstance(value, dict):
+            _merge_missing(data[key], value)
+
 class NetflixBase(object):
     '''
     This is the base netflix object class that we will build
     netflix resources (title, user, person, etc.) on.
     '''
+    # data keys that are loaded from a link with a different name
+    _link_keys = {}
+
+    # property name -> the data key it reads, for properties that can be prefetched
+    _property_fields = {}
+
+    # if True, there is only ever one object per resource for each client (see __new__)
+    _identity_mapped = False
+
+    # The data keys that looking up an unknown attribute (item.foo) may go
+    # to netflix for. Anything else that isn't already loaded raises
+    # AttributeError. None allows any key.
+    _fetchable = None
+
+    # True to never go to netflix for data this item doesn't have yet (see
+    # get_info), False to always allow it. None follows the client.
+    offline = None
+
+    def __new__(cls, raw_json=None, client=None, *args, **kwargs):
+        # hand back the object the client already has for this resource, if there is one
+        key = cls._identity_key(raw_json, client)
+        if key:
+            with client._lock:
+                existing = client.identity_map.get(key)
+            if type(existing) is cls:
+                return existing
+
+        return super(NetflixBase, cls).__new__(cls)
+
     def __init__(self, raw_json, client):
+        if 'data' in self.__dict__:
+            # we came out of the identity map, so just add anything new we've
+            # been given. What we already have is never replaced, it may well
+            # be more complete than a partial copy of the same resource.
+            with self.client._lock:
+                _merge_missing(self.data, raw_json)
+            return
+
         self.client = client
 
         self.data = raw_json
         self.meta = None
 
+        key = self._identity_key(raw_json, client)
+        if key:
+            with client._lock:
+                client.identity_map[key] = self
+
+    @classmethod
+    def _unmapped(cls, raw_json, client):
+        '''
+        build an item that is kept out of the identity map, for partial
+        copies of a resource that mustn't be mixed into the shared one
+        '''
+        item = object.__new__(cls)
+        item.client = client
+        item.data = raw_json
+        item.meta = None
+        return item
+
+    @classmethod
+    def _identity_key(cls, raw_json, client):
+        if cls._identity_mapped and getattr(client, 'identity_map', None) is not None and isinstance(raw_json, dict) and 'id' in raw_json:
+            return resource_id(raw_json['id'])
+        return None
+
     def __getattr__(self, name):
+        # hasattr, copy, pickle, debuggers etc. probe for dunder and private
+        # names, and data/meta/client are only missing while we're being built.
+        # None of those are fields, so they must never cause a request.
+        if name.startswith('_') or name in ('data', 'meta', 'client'):
+            raise AttributeError(name)
+
+        # a property raised AttributeError (like OfflineAccessError) on its
+        # way, run it again so that error comes out instead of a field lookup
+        attribute = getattr(type(self), name, None)
+        if isinstance(attribute, property):
+            return attribute.__get__(self, type(self))
+
+        if name not in self.data and self._fetchable is not None and name not in self._fetchable:
+            raise AttributeError('%s has no field %r' % (type(self).__name__, name))
+
         return self.get_info(name)
 
+    def is_offline(self):
+        if self.offline is not None:
+            return self.offline
+        return self.client.is_offline()
+
+    def peek(self, key, default=None):
+        '''
+        the value of `key` if it has been loaded, otherwise default. Never makes a request.
+        '''
+        return self.data.get(key, default)
+
+    @classmethod
+    def _fields_for(cls, properties):
+        '''
+        turn property names (like 'synopsis' or 'is_hd') into the data keys they read
+        '''
+        keys = []
+        for name in properties:
+            try:
+                key = cls._property_fields[name]
+            except KeyError:
+                raise ValueError("%s can't prefetch %r" % (cls.__name__, name))
+            if key not in keys:
+                keys.append(key)
+        return keys
+
+    @classmethod
+    def _expand_for(cls, keys, expand=None):
+        '''
+        build the expand parameter that loads `keys` along with a list of items
+        '''
+        expand = [expand] if expand else []
+        expand += ['@%s' % cls._link_keys.get(key, key) for key in keys]
+        return ','.join(expand) or None
+
     @property
     def id(self):
         return self.data['id'].split('.com')[1]
@@ -51,10 +175,20 @@ class NetflixBase(object):
         The key for the dict that stores data for this item type
         '''
 
-        if self.type in ['movie', 'series', 'season', 'episode']:
+        if self.type in ['movie', 'series', 'season', 'program', 'disc']:
             return 'catalog_title'
         return self.type
 
+    def get_info_async(self, key, request_key=None, params=None):
+        '''
+        like get_info, but returns an AsyncResult (right away with an AsyncNetflixClient, which runs get_info in the background).
+        Use it to load fields on lots of items at once:
+
+            pending = [title.get_info_async('synopsis') for title in titles]
+            synopses = [p.get() for p in pending]
+        '''
+        return self.client.submit(self.get_info, key, request_key, params)
+
     def get_info(self, key, request_key=None, params=None):
         '''
         This function will get the given key from the resource.
@@ -65,29 +199,64 @@ class NetflixBase(object):
         key: the key to get info from
         request_key: if the key to request and the key results are differnt, set the request_key key here
 
+        If this item (or its client) is offline, a key that hasn't been
+        downloaded raises OfflineAccessError instead.
         '''
 
         if key in self.data:
             return self.data[key]
+        elif self.is_offline():
+            raise OfflineAccessError("%s %s hasn't loaded %r, and is offline" % (type(self).__name__, self.url, key))
         else:
-            # first we should make sure we have the complete resource (and not just a search result)
-            if not self.meta:
-                full_data = self.client.get_resource(self.url)
-                self.meta = full_data['meta']
-                self.data = full_data[self._resource]
-
-            # see if what the user is looking for is still on the server
-            if 'links' in self.meta and request_key in self.meta['links']:
-                resource = self.client.get_resource(self.meta['links'][request_key or key], params=params)
-
-                if resource:
-                    try:
-                        self.data[key] = resource[key]
-                    except KeyError:
-                        try:
-                            self.data[key] = self.client.get_resource(self.meta['links'][request_key or key])
-                        except KeyError:
-                            pass
+            metrics = getattr(self.client, 'metrics', None)
+            if metrics is None:
+                self._load_info(key, request_key, params)
+            else:
+                with metrics.lazy_load(key, sys._getframe()):
+                    self._load_info(key, request_key, params)
         if key in self.data:
             return self.data[key]
         return None
+
+    def _load_info(self, key, request_key=None, params=None):
+        # first we should make sure we have the complete resource (and not just a search result)
+        if not self.meta:
+            self._set_resource(self.client.get_resource(self.url))
+
+        # see if what the user is looking for is still on the server
+        link = self._link(key, request_key)
+        if link:
+            resource = self.client.get_resource(link, params=params)
+
+            if resource:
+                self._set_link_data(key, resource)
+
+    def _set_resource(self, full_data):
+        '''
+        store a full resource response (meta and all) on this item,
+        keeping anything we already loaded from its links
+        '''
+        with self.client._lock:
+            data = full_data[self._resource]
+            for key, value in self.data.items():
+                data.setdefault(key, value)
+
+            # swap data in before meta, so anyone who sees the meta sees the full data too
+            self.data = data
+            self.meta = full_data['meta']
+
+    def _link(self, key, request_key=None):
+        '''
+        the url of the link that has the data for `key`, if this item has one
+        '''
+        if self.meta and 'links' in self.meta:
+            return self.meta['links'].get(request_key or self._link_keys.get(key, key))
+        return None
+
+    def _set_link_data(self, key, resource):
+        # most links wrap their data in the key we asked for, but not all of them do
+        with self.client._lock:
+            if key in resource:
+                self.data[key] = resource[key]
+            else:
+                self.data[key] = resource
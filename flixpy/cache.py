@@ -0,0 +1,111 @@
+import time
+import json
+import threading
+
+from collections import OrderedDict
+
+# how long (in seconds) a cached response is used before we check back with netflix.
+# After this the response is revalidated with its etag, so an unchanged resource
+# only costs a 304.
+DEFAULT_TTLS = {
+    'catalog_title': 60 * 60,
+    'people': 60 * 60,
+    'user': 60,
+    'queue': 0,
+    'other': 60,
+}
+
+class CacheEntry(object):
+    def __init__(self, body, etag, ttl):
+        self.body = body
+        self.etag = etag
+        self.ttl = ttl
+        self.expires = time.time() + ttl
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def is_fresh(self):
+        return time.time() < self.expires
+
+    def json(self):
+        # decode every time so callers never share (and change) the same dict
+        return json.loads(self.body)
+
+class ResponseCache(object):
+    '''
+    An in memory LRU cache of decoded GET responses, used by NetflixClient.get_resource.
+
+    Entries are keyed with flixpy.utils.request_key, expire after the ttl set
+    for their resource type, and the least recently used entries are dropped
+    once there are more than max_entries of them or they take up more than
+    max_bytes.
+
+    To plug in a different cache, pass any object with the same get, set,
+    revalidated and invalidate methods to NetflixClient as `cache`.
+    '''
+    def __init__(self, max_entries=1000, max_bytes=16 * 1024 * 1024, ttls=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''
+        get the entry for a key, fresh or not. Stale entries are still
+        returned so they can be revalidated.
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, body, etag, resource_type):
+        with self._lock:
+            self._remove(key)
+
+            entry = CacheEntry(body, etag, self.ttls.get(resource_type, self.ttls['other']))
+            self._entries[key] = entry
+            self.size += entry.size
+
+            while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def revalidated(self, key):
+        '''
+        netflix told us the entry hasn't changed, so it's good for another ttl
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.expires = time.time() + entry.ttl
+
+    def invalidate(self, path):
+        '''
+        drop everything cached for `path`, and for any resource above or below it
+        '''
+        with self._lock:
+            for key in list(self._entries):
+                if key[0].startswith(path) or path.startswith(key[0]):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
@@ -1,13 +1,72 @@
 from title import NetflixTitle
+from .stream import iter_json_array
+from .snapshot import CatalogSnapshot
+from .compact import CompactTitle
+from .concurrency import iter_prefetched
+from .graph import CastGraph
+
+# how many results netflix sends for a search when max_results isn't given
+DEFAULT_MAX_RESULTS = 25
 
 class NetflixCatalog(object):
-    def __init__(self, client):
+    def __init__(self, client, snapshot=None):
         self.client = client
 
+        # an optional CatalogSnapshot that titles are looked up in before we go to the api
+        self.snapshot = None
+        if snapshot:
+            self.load_snapshot(snapshot)
+
+    def load_snapshot(self, snapshot):
+        '''
+        serve get_title_by_id and search from a local snapshot (a CatalogSnapshot or a path to one)
+        '''
+        if not isinstance(snapshot, CatalogSnapshot):
+            snapshot = CatalogSnapshot(snapshot)
+        self.snapshot = snapshot
+
+    def save_snapshot(self, path, expand=None):
+        '''
+        download the streaming catalog into a snapshot at `path`. Returns the number of titles saved.
+        '''
+        return CatalogSnapshot.write(path, self.iter_streaming(expand=expand))
+
+    def cast_graph(self):
+        '''
+        A CastGraph (see flixpy.graph) of who is in and directed every
+        streaming title. Built from the snapshot if there is one (save it with
+        expand='@cast,@directors'), otherwise from a crawl of the catalog.
+        '''
+        if self.snapshot is not None:
+            return CastGraph.build(self.snapshot)
+        return CastGraph.build(self.iter_streaming(expand='@cast,@directors'))
+
     def streaming(self, *args, **kwargs):
         # NOTE this downloads *all* the streaming titles on netflix. This may take a while ;)
+        # use iter_streaming if you don't want to hold all of them in memory.
         return self.client.get_resource('/catalog/titles/streaming', *args, **kwargs)
 
+    def iter_streaming(self, expand=None, chunk_size=64 * 1024, compact=False):
+        '''
+        Yields every streaming title as a NetflixTitle while the catalog is
+        still downloading. Unlike `streaming` this never holds the whole
+        catalog in memory, only the title currently being parsed.
+
+        compact: yield CompactTitle objects instead, for when you are keeping
+                 lots of them around
+        '''
+        params = {}
+        if expand:
+            params['expand'] = expand
+
+        chunks = self.client.iter_resource('/catalog/titles/streaming', params, chunk_size=chunk_size)
+
+        for raw_title in iter_json_array(chunks, 'catalog'):
+            if compact:
+                yield CompactTitle.from_raw(raw_title, self.client)
+            else:
+                yield NetflixTitle(raw_title, self.client)
+
     def _search(self, url, term, expand=None, parameters=None):
         if not parameters:
             parameters = {}
@@ -23,7 +82,32 @@ class NetflixCatalog(object):
             return results['autocomplete']['title']
         return []
 
-    def search(self, term, startIndex=None, maxResults=None, expand=None, show_disks=False):
+    def search(self, term, startIndex=None, maxResults=None, expand=None, show_disks=False, fields=None):
+        '''
+        fields: NetflixTitle properties (like 'synopsis' or 'is_hd') to load on every result up front,
+                so reading them later doesn't need another request
+        '''
+        keys = NetflixTitle._fields_for(fields or [])
+
+        # the snapshot only has streaming titles, and no expanded data
+        if self.snapshot and not expand and not show_disks:
+            results = self.snapshot.search(term, startIndex, maxResults or DEFAULT_MAX_RESULTS)
+            if results:
+                return self.client.hydrate([NetflixTitle(title, self.client) for title in results], keys)
+
+        expand = NetflixTitle._expand_for(keys, expand)
+
+        results = self._search('/catalog/titles', term, expand, self._search_parameters(startIndex, maxResults, show_disks))
+
+        try:
+            titles = [NetflixTitle(title, self.client) for title in results['catalog']]
+        except KeyError:
+            return []
+
+        # fill in anything the expand didn't cover
+        return self.client.hydrate(titles, keys)
+
+    def _search_parameters(self, startIndex=None, maxResults=None, show_disks=False):
         parameters = {}
 
         if not show_disks:
@@ -33,17 +117,55 @@ class NetflixCatalog(object):
         if maxResults:
             parameters['max_results'] = maxResults
 
-        results = self._search('/catalog/titles', term, expand, parameters)
+        return parameters
+
+    def iter_search(self, term, page_size=25, prefetch=2, expand=None, show_disks=False, fields=None):
+        '''
+        Yields every title matching `term`, one page of `page_size` results
+        at a time. While you work through a page, up to `prefetch` of the
+        following pages are downloaded in the background. Paging stops at the
+        total number of results netflix reports, and if you stop iterating,
+        pages further along than that are never requested.
+        '''
+        keys = NetflixTitle._fields_for(fields or [])
+        expand = NetflixTitle._expand_for(keys, expand)
+
+        def fetch_page(start_index):
+            return self._search('/catalog/titles', term, expand, self._search_parameters(start_index, page_size, show_disks))
+
+        def titles(results):
+            titles = [NetflixTitle(title, self.client) for title in results.get('catalog', [])]
+            return self.client.hydrate(titles, keys)
+
+        # the first page tells us how many pages there are
+        first_page = fetch_page(0)
+        for title in titles(first_page):
+            yield title
 
         try:
-            return [NetflixTitle(title, self.client) for title in results['catalog']]
-        except KeyError:
-            return []
+            total = int(first_page['meta']['number_of_results'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        for results in iter_prefetched(self.client._carry_context(fetch_page), xrange(page_size, total, page_size), prefetch):
+            for title in titles(results):
+                yield title
+
+    def search_async(self, *args, **kwargs):
+        '''
+        like search, but returns an AsyncResult (right away with an AsyncNetflixClient, which runs search in the background)
+        '''
+        return self.client.submit(self.search, *args, **kwargs)
 
     def get_title_by_id(self, netflix_id, expand=None):
         ''' get a title object using the titles netflix id (partial url):
             /catalog/titles/movies/60021896
         '''
+        if self.snapshot and not expand:
+            raw_title = self.snapshot.get(netflix_id)
+            if raw_title:
+                return NetflixTitle(raw_title, self.client)
+
         raw_title = self.client.get_resource(netflix_id, expand=expand)
 
         title = NetflixTitle(raw_title['catalog_title'], self.client)
@@ -1,20 +1,90 @@
 import re
-import httplib
+import time
+import codecs
 import logging
+import weakref
+import threading
 
-import requests
+from contextlib import contextmanager
+
+from requests.exceptions import Timeout
 from requests_oauthlib import OAuth1
 
 from .catalog import NetflixCatalog
+from .concurrency import concurrent_map, CompletedResult, SingleFlight, NullLock
+from .exceptions import DeadlineExceeded
+from .session import create_session
+from .scheduler import INTERACTIVE
+from .utils import request_key, resource_type
 from .user import NetflixUser
 
 log = logging.getLogger('flixpy.client')
 
 class NetflixClient(object):
-    def __init__(self, application_name, client_key, client_secret, resource_owner_key=None, resource_owner_secret=None, callback=None, user_id=None):
+    def __init__(self, application_name, client_key, client_secret, resource_owner_key=None, resource_owner_secret=None, callback=None, user_id=None,
+                 session=None, pool_connections=10, pool_maxsize=10, pool_block=False, snapshot=None,
+                 cache=None, max_workers=8, scheduler=None, thread_safe=False, timeout=None, hedger=None, metrics=None):
         self.application_name = application_name
         self.server = 'api-public.netflix.com'
-        self.connection = httplib.HTTPConnection(self.server, '80')
+
+        # All requests go through one keep-alive connection pool. Pass in a
+        # session (see flixpy.session.create_session) to share a pool between
+        # clients, otherwise we make one just for this client.
+        if session is None:
+            session = create_session(pool_connections, pool_maxsize, pool_block)
+        self.session = session
+
+        # an optional ResponseCache (see flixpy.cache) for GET requests
+        self.cache = cache
+
+        # how many requests batch calls like hydrate run at once
+        self.max_workers = max_workers
+
+        # In thread safe mode one client can be shared between threads: the
+        # shared state (the identity map, item data loaded by get_info and
+        # hydrate, the users queue, and switching users in get_access_token)
+        # is only changed while holding this lock. Requests themselves run in
+        # parallel. Without it the lock does nothing.
+        self.thread_safe = thread_safe
+        self._lock = threading.RLock() if thread_safe else NullLock()
+
+        # an optional RequestScheduler (see flixpy.scheduler) that keeps us
+        # under netflix's rate limits. Can be shared between clients.
+        self.scheduler = scheduler
+        self._local = threading.local()
+
+        # True to never lazy load data on titles, people etc. (get_info raises
+        # OfflineAccessError instead). See also offline_mode().
+        self.offline = False
+
+        # the longest (in seconds) any single request may take, see also deadline()
+        self.timeout = timeout
+
+        # an optional Hedger (see flixpy.hedge) to send a second copy of slow GETs
+        self.hedger = hedger
+
+        # identical GETs that are made at the same time (from different
+        # threads) share one request. Set to None to turn this off.
+        self.single_flight = SingleFlight()
+
+        # an optional ClientMetrics (see flixpy.metrics) that times every
+        # request and counts lazy loads, and hooks called around every request
+        # (see register_hook). With neither set they cost nothing.
+        self.metrics = metrics
+        self.hooks = {'pre_request': [], 'post_request': []}
+
+        # every title and person this client has handed out, by id. Building a
+        # NetflixTitle for a title that's already in here returns the existing
+        # object, so anything loaded on it is seen everywhere. Set to None to
+        # turn this off.
+        self.identity_map = weakref.WeakValueDictionary()
+
+        # the SeriesTree (see flixpy.series) for every series we've numbered
+        # titles in, by the id of each title in it
+        self.series_trees = {}
+
+        # an optional SimilarsIndex (see flixpy.similars) that title.similar reads from
+        self.similars = None
 
         # Setting up the OAuth client
         # This gets a little more complex than I would like because requests requries unicode.
@@ -37,12 +107,9 @@ class NetflixClient(object):
             self.user = NetflixUser(self, user_id)
 
         # Attach the netflix catalog functions
-        self.catalog = NetflixCatalog(self)
-
-        # setup a placeholder for the users instant queue
-        self.instant_queue = None
+        self.catalog = NetflixCatalog(self, snapshot)
 
-    def _request(self, method, url, params=None, data=None, default_params=True, **kwargs):
+    def _build_request(self, url, params=None, default_params=True):
         if not re.match('http', url):
             url = "http://%s%s" % (self.server, url)
 
@@ -55,20 +122,291 @@ class NetflixClient(object):
         if params:
             request_params = dict(request_params.items() + params.items())
 
-        response = requests.request(method, url, params=request_params, data=data, allow_redirects=True, auth=self.oauth, headers={'Accept-encoding': 'gzip'}, **kwargs)
+        return url, request_params
+
+    @contextmanager
+    def priority(self, priority):
+        '''
+        Requests made inside this block (from this thread) are sent at
+        `priority` (see flixpy.scheduler). Use it to keep crawls out of the way
+        of interactive lookups:
+
+            with netflix.priority(BACKGROUND):
+                netflix.catalog.save_snapshot(path)
+        '''
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @contextmanager
+    def deadline(self, seconds):
+        '''
+        Every request made inside this block (from this thread, and from the
+        worker threads batch calls like hydrate start) has to be done within
+        `seconds`, no matter how many requests that takes. Once the time is
+        up, requests raise DeadlineExceeded.
+
+            with netflix.deadline(2):
+                title.synopsis
+
+        Nested deadlines can only shorten the time left, never extend it.
+        '''
+        previous = getattr(self._local, 'deadline', None)
+
+        deadline = previous
+        if seconds is not None:
+            deadline = time.time() + seconds
+            if previous is not None:
+                deadline = min(deadline, previous)
+
+        self._local.deadline = deadline
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
+
+    @contextmanager
+    def offline_mode(self):
+        '''
+        Nothing inside this block (in this thread) lazy loads: fields that
+        haven't been downloaded raise OfflineAccessError. Wrap code that must
+        not make requests, like rendering, in it:
+
+            with netflix.offline_mode():
+                render(titles)
+        '''
+        previous = getattr(self._local, 'offline', False)
+        self._local.offline = True
+        try:
+            yield
+        finally:
+            self._local.offline = previous
+
+    def is_offline(self):
+        return self.offline or getattr(self._local, 'offline', False)
+
+    def _timeout(self):
+        '''
+        the timeout for the next request: the time left before the deadline,
+        capped at self.timeout
+        '''
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None:
+            return self.timeout
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded('deadline exceeded')
+
+        if self.timeout is not None:
+            return min(remaining, self.timeout)
+        return remaining
+
+    def _carry_context(self, func):
+        '''
+        wrap func so the requests it makes from a worker thread are sent with
+        the same priority, deadline and offline mode as the thread that created it
+        '''
+        priority = getattr(self._local, 'priority', None)
+        deadline = getattr(self._local, 'deadline', None)
+        offline = getattr(self._local, 'offline', False)
+
+        def wrapper(*args, **kwargs):
+            previous = getattr(self._local, 'deadline', None), getattr(self._local, 'offline', False)
+            self._local.deadline, self._local.offline = deadline, offline
+            try:
+                with self.priority(priority):
+                    return func(*args, **kwargs)
+            finally:
+                self._local.deadline, self._local.offline = previous
+        return wrapper
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        run func(*args, **kwargs) and return its result as an (already
+        finished) AsyncResult. AsyncNetflixClient runs it in the background
+        instead, so the *_async methods work with either client.
+        '''
+        return CompletedResult(func, *args, **kwargs)
+
+    def _session_request(self, method, url, **kwargs):
+        try:
+            return self.session.request(method, url, **kwargs)
+        except Timeout:
+            # if the timeout was cut short by our deadline, say so
+            deadline = getattr(self._local, 'deadline', None)
+            if deadline is not None and time.time() >= deadline - 0.01:
+                raise DeadlineExceeded('deadline exceeded')
+            raise
+
+    def register_hook(self, event, hook):
+        '''
+        Call hook around every http request this client sends. event is one of:
+            'pre_request':  hook(method, url, params)
+            'post_request': hook(method, url, params, response, elapsed)
+        response is None if the request failed without one (timeouts, etc.)
+        '''
+        self.hooks[event].append(hook)
+
+    def _send(self, method, url, priority=None, auth=None, **kwargs):
+        # nothing is watching, go straight out
+        if self.metrics is None and not self.hooks['pre_request'] and not self.hooks['post_request']:
+            return self._dispatch(method, url, priority, auth, **kwargs)
+
+        params = kwargs.get('params')
+        for hook in self.hooks['pre_request']:
+            hook(method, url, params)
+
+        started = time.time()
+        response = None
+        try:
+            response = self._dispatch(method, url, priority, auth, **kwargs)
+            return response
+        finally:
+            elapsed = time.time() - started
+            if self.metrics is not None:
+                self.metrics.record_request(method, resource_type(url), elapsed, response is not None and response.status_code or None)
+            for hook in self.hooks['post_request']:
+                hook(method, url, params, response, elapsed)
+
+    def _dispatch(self, method, url, priority=None, auth=None, **kwargs):
+        '''
+        send a request through the session, waiting for the scheduler (if there is one) to let it go
+        '''
+        # read this once, another thread may be switching users
+        auth = auth or self.oauth
+
+        timeout = self._timeout()
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+
+        if self.scheduler is None:
+            return self._session_request(method, url, auth=auth, **kwargs)
+
+        if priority is None:
+            priority = getattr(self._local, 'priority', None)
+        if priority is None:
+            priority = INTERACTIVE
+
+        keys = [('consumer', self.client_key)]
+        if auth.client.resource_owner_key:
+            keys.append(('user', auth.client.resource_owner_key))
+
+        started = self.scheduler.acquire(priority, keys, getattr(self._local, 'deadline', None))
+        status = None
+        try:
+            # waiting for the scheduler may have used up some of our time
+            if timeout is not None:
+                kwargs['timeout'] = self._timeout()
+            response = self._session_request(method, url, auth=auth, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self.scheduler.release(started, status)
+
+    def _request(self, method, url, params=None, data=None, default_params=True, priority=None, auth=None, deadline=None, **kwargs):
+        if deadline is not None:
+            with self.deadline(deadline):
+                return self._request(method, url, params, data, default_params, priority, auth, **kwargs)
+
+        url, request_params = self._build_request(url, params, default_params)
+
+        headers = {'Accept-encoding': 'gzip'}
+
+        key = request_key(url, request_params)
+
+        # oauth responses (and anything signed with one off credentials) must
+        # never be cached, or sent twice by the hedger (each one uses up a token)
+        one_off = auth is not None or key[0].startswith('/oauth')
+        use_cache = self.cache is not None and not one_off
+
+        cached = None
+        if use_cache:
+
+            if method == 'get':
+                cached = self.cache.get(key)
+                if cached:
+                    if cached.is_fresh():
+                        return cached.json()
+                    if cached.etag:
+                        headers['If-None-Match'] = cached.etag
+            else:
+                # anything we change on the server is now out of date in the cache
+                self.cache.invalidate(key[0])
+
+        def send():
+            return self._send(method, url, priority, auth, params=request_params, data=data, allow_redirects=True, headers=headers, **kwargs)
+
+        if self.hedger is not None and method == 'get' and not one_off:
+            # GETs are safe to send twice
+            response = self.hedger.run(self._carry_context(send))
+        else:
+            response = send()
+
+        if cached and response.status_code == 304:
+            self.cache.revalidated(key)
+            return cached.json()
 
         # raise an error if we get it
         response.raise_for_status()
 
-        return response.json()
+        result = response.json()
+
+        if use_cache and method == 'get':
+            self.cache.set(key, response.content, self._etag(response, result), resource_type(url))
+
+        return result
+
+    def _etag(self, response, result):
+        etag = response.headers.get('etag')
+
+        if not etag and isinstance(result, dict):
+            try:
+                etag = result['meta']['etag']
+            except (KeyError, TypeError):
+                pass
+
+        return etag
+
+    def iter_resource(self, url, params=None, chunk_size=64 * 1024, default_params=True, priority=None):
+        '''
+        Like get_resource, but yields the body as unicode chunks as it comes
+        off the wire instead of reading and decoding all of it at once.
+        '''
+        url, request_params = self._build_request(url, params, default_params)
+
+        response = self._send('get', url, priority, params=request_params, allow_redirects=True, headers={'Accept-encoding': 'gzip'}, stream=True)
+
+        try:
+            response.raise_for_status()
+
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            for chunk in response.iter_content(chunk_size):
+                yield decoder.decode(chunk)
+            yield decoder.decode('', final=True)
+        finally:
+            response.close()
 
     def get_resource(self, url, params=None, expand=None, **kwargs):
+        if kwargs.get('deadline') is not None:
+            with self.deadline(kwargs.pop('deadline')):
+                return self.get_resource(url, params, expand, **kwargs)
+
         if expand:
             if not params:
                 params = {}
             params['expand'] = expand
 
-        return self._request('get', url, params, **kwargs)
+        # requests signed with other credentials can't share a response with ours
+        if self.single_flight is None or kwargs.get('auth') is not None:
+            return self._request('get', url, params, **kwargs)
+
+        key = request_key(*self._build_request(url, params, kwargs.get('default_params', True)))
+
+        return self.single_flight.do(key, lambda: self._request('get', url, params, **kwargs), getattr(self._local, 'deadline', None))
 
     def post_resource(self, url, params=None, data=None, **kwargs):
         return self._request('post', url, params, data, **kwargs)
@@ -76,6 +414,57 @@ class NetflixClient(object):
     def delete_resource(self, url, params=None, **kwargs):
         return self._request('delete', url, params, **kwargs)
 
+    def hydrate(self, items, fields, max_workers=None):
+        '''
+        Load `fields` (data keys like 'synopsis' or 'delivery_formats') on a
+        whole list of items (titles, people, etc.) at once, instead of letting
+        each item lazily fetch them one request at a time.
+
+        Items that only have search result data are fetched in full with every
+        field they're missing expanded into that same request. Anything still
+        missing after that is fetched from its own link. All requests run
+        concurrently, up to max_workers at a time.
+        '''
+        max_workers = max_workers or self.max_workers
+        items = list(items)
+        fields = list(fields)
+
+        incomplete = []
+        seen = set()
+        for item in items:
+            if id(item) not in seen and any(field not in item.data for field in fields):
+                seen.add(id(item))
+                incomplete.append(item)
+
+        def fetch_full(item):
+            expand = ','.join('@%s' % item._link_keys.get(field, field) for field in fields if field not in item.data)
+            return self.get_resource(item.url, expand=expand)
+
+        partial = [item for item in incomplete if not item.meta]
+        for item, full_data in zip(partial, concurrent_map(self._carry_context(fetch_full), partial, max_workers)):
+            item._set_resource(full_data)
+
+        def fetch_link(item_field):
+            item, field = item_field
+            return self.get_resource(item._link(field))
+
+        missing = [(item, field) for item in incomplete for field in fields if field not in item.data and item._link(field)]
+        for (item, field), resource in zip(missing, concurrent_map(self._carry_context(fetch_link), missing, max_workers)):
+            if resource:
+                item._set_link_data(field, resource)
+
+        return items
+
+    def fetch_many(self, urls, params=None, expand=None, max_workers=None):
+        '''
+        get_resource for every url in `urls`, running up to max_workers
+        requests at once. The results come back in the same order as urls.
+        '''
+        def fetch(url):
+            return self.get_resource(url, dict(params) if params else None, expand=expand)
+
+        return concurrent_map(self._carry_context(fetch), urls, max_workers or self.max_workers)
+
     # Auth
 
     def get_request_token_url(self):
@@ -90,13 +479,19 @@ class NetflixClient(object):
         return (secret_and_token, url)
 
     def get_access_token(self, secret, token):
-        self.oauth = OAuth1(self.client_key, self.client_secret, token, secret, signature_type='auth_header')
+        # sign just this request with the request token, so other threads keep using the current credentials
+        request_auth = OAuth1(self.client_key, self.client_secret, token, secret, signature_type='auth_header')
+
+        response = self._request('get', '/oauth/access_token', auth=request_auth)
 
-        response = self.get_resource('/oauth/access_token')
+        oauth = OAuth1(self.client_key, self.client_secret, unicode(response['oauth_token']), unicode(response['oauth_token_secret']), signature_type='query')
 
-        # connect this new user to this client
-        self.oauth = OAuth1(self.client_key, self.client_secret, unicode(response['oauth_token']), unicode(response['oauth_token_secret']), signature_type='query')
-        self.user = NetflixUser(self)
+        # load the new user with its own credentials outside the lock (other
+        # threads' requests carry on meanwhile), then connect it to this client
+        user = NetflixUser(self, auth=oauth)
+        with self._lock:
+            self.oauth = oauth
+            self.user = user
 
         return response
 
@@ -0,0 +1,208 @@
+from datetime import timedelta
+
+from .title import NetflixTitle
+
+# marks a field we haven't downloaded yet (as opposed to one netflix doesn't have)
+_UNLOADED = object()
+
+_interned = {}
+
+def _intern(value):
+    '''
+    share one copy of strings that repeat across lots of titles
+    (url prefixes, ratings, etc.)
+    '''
+    if value is None:
+        return None
+    return _interned.setdefault(value, value)
+
+class CompactTitle(object):
+    '''
+    A small, fixed layout version of NetflixTitle for holding lots of titles
+    (the whole streaming catalog, or many users queues) in memory.
+
+    Instead of the raw json, only the values NetflixTitle's properties read
+    are kept, as typed fields. The id is split into a shared url prefix and
+    the title number, so the long url isn't repeated in every object.
+
+    The NetflixTitle properties all work the same here. Anything that isn't
+    stored (cast(), add_to_queue(), etc.) is passed on to a full NetflixTitle
+    built from this one, as is loading a field that wasn't downloaded yet.
+    '''
+    __slots__ = ('client', '_prefix', '_number', '_title', '_synopsis', '_instant', '_mpaa_rating', '_tv_rating', '_hd', '_runtime', '_full')
+
+    def __init__(self, url, title, client):
+        prefix, number = url.rsplit('/', 1)
+
+        self.client = client
+        self._prefix = _intern(prefix + '/')
+        self._number = int(number) if number.isdigit() else number
+        self._title = title
+
+        self._synopsis = _UNLOADED
+        self._instant = _UNLOADED
+        self._mpaa_rating = None
+        self._tv_rating = None
+        self._hd = False
+        self._runtime = None
+
+        # the NetflixTitle that anything we don't store was handed on to, so
+        # what it loads is kept (None until something needs it)
+        self._full = None
+
+    @classmethod
+    def from_raw(cls, raw_json, client):
+        title = raw_json['title']
+        if isinstance(title, dict):
+            title = title['regular']
+
+        compact = cls(raw_json['id'], title, client)
+
+        if 'synopsis' in raw_json:
+            compact._set_synopsis(raw_json['synopsis'])
+        if 'delivery_formats' in raw_json:
+            compact._set_delivery_formats(raw_json['delivery_formats'])
+
+        return compact
+
+    @classmethod
+    def from_title(cls, title):
+        return cls.from_raw(title.data, title.client)
+
+    def __repr__(self):
+        return '<CompactTitle %s>' % self.id
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.to_title(), name)
+
+    def to_raw(self):
+        '''
+        rebuild the raw json for this title (only the fields we store)
+        '''
+        raw = {
+            'id': self.url,
+            'title': {'regular': self._title},
+        }
+
+        if self._synopsis is not _UNLOADED:
+            raw['synopsis'] = {'regular': self._synopsis}
+
+        if self._instant is not _UNLOADED:
+            raw['delivery_formats'] = {}
+            if self._instant:
+                instant = raw['delivery_formats']['instant'] = {}
+                if self._mpaa_rating:
+                    instant['mpaa_ratings'] = self._mpaa_rating
+                if self._tv_rating:
+                    instant['tv_ratings'] = self._tv_rating
+                if self._hd:
+                    instant['quality'] = 'HD'
+                if self._runtime is not None:
+                    instant['runtime'] = self._runtime
+
+        return raw
+
+    def to_title(self):
+        '''
+        A full NetflixTitle for this title: the one the client already has,
+        if there is one. Otherwise a new one that stays out of the identity
+        map, so our cut down json never ends up in the shared title.
+
+        The title is kept on this object, so anything it loads (cast, etc.)
+        is only requested once.
+        '''
+        if self._full is not None:
+            return self._full
+
+        title = None
+        key = NetflixTitle._identity_key({'id': self.url}, self.client)
+        if key:
+            with self.client._lock:
+                existing = self.client.identity_map.get(key)
+            if type(existing) is NetflixTitle:
+                title = existing
+
+        if title is None:
+            title = NetflixTitle._unmapped(self.to_raw(), self.client)
+
+        self._full = title
+        return title
+
+    def _set_synopsis(self, raw):
+        self._synopsis = raw['regular'] if raw else None
+
+    def _set_delivery_formats(self, raw):
+        instant = (raw or {}).get('instant')
+
+        self._instant = instant is not None
+        if instant:
+            self._mpaa_rating = _intern(instant.get('mpaa_ratings'))
+            self._tv_rating = _intern(instant.get('tv_ratings'))
+            self._hd = instant.get('quality') == 'HD'
+            self._runtime = instant.get('runtime')
+
+    # NetflixTitle API
+
+    @property
+    def data(self):
+        return self.to_raw()
+
+    @property
+    def url(self):
+        return '%s%s' % (self._prefix, self._number)
+
+    @property
+    def id(self):
+        return self.url.split('.com')[1]
+
+    @property
+    def type(self):
+        raw = self._prefix.split('/')[-2]
+
+        if raw == 'people':
+            return 'person'
+        elif raw != 'series':
+            return raw[0:-1]
+        return raw
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def synopsis(self):
+        if self._synopsis is _UNLOADED:
+            self._set_synopsis(self.to_title().get_info('synopsis'))
+        return self._synopsis
+
+    @property
+    def is_available(self):
+        if self._instant is _UNLOADED:
+            self._set_delivery_formats(self.to_title().get_info('delivery_formats', 'format_availability'))
+        return self._instant
+
+    @property
+    def mpaa_rating(self):
+        return self._mpaa_rating if self.is_available else None
+
+    @property
+    def tv_rating(self):
+        return self._tv_rating if self.is_available else None
+
+    @property
+    def is_hd(self):
+        return self._hd if self.is_available else False
+
+    @property
+    def length(self):
+        if self.is_available and self._runtime:
+            return str(timedelta(seconds=self._runtime))
+        return None
+
+    @property
+    def watch_link(self):
+        if self.is_available:
+            return 'https://movies.netflix.com/WiPlayer?movieid=%s' % self._number
+        return None
@@ -0,0 +1,166 @@
+import copy
+import time
+import threading
+
+from itertools import islice
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from .exceptions import DeadlineExceeded
+
+def concurrent_map(func, items, max_workers=8):
+    '''
+    Call func on every item using up to max_workers threads.
+    The results come back in the same order as items.
+    '''
+    items = list(items)
+
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+def iter_prefetched(func, items, prefetch=2):
+    '''
+    A lazy map(func, items): results are yielded in order, and while the
+    caller works on one result, func is already running on up to `prefetch`
+    of the following items in the background.
+
+    Stop iterating early and func is never called for items further along
+    than that.
+    '''
+    items = iter(items)
+
+    if prefetch < 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pool = ThreadPool(prefetch)
+    try:
+        pending = deque(pool.apply_async(func, (item,)) for item in islice(items, prefetch))
+
+        while pending:
+            result = pending.popleft().get()
+
+            # keep the window full before handing the result over
+            for item in islice(items, 1):
+                pending.append(pool.apply_async(func, (item,)))
+
+            yield result
+    finally:
+        # let anything already running finish, but don't wait for it
+        pool.close()
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+        # how many callers are waiting on this call
+        self.waiters = 0
+
+class SingleFlight(object):
+    '''
+    Makes sure only one call per key runs at a time. Anyone asking for a key
+    that is already running waits for that call and gets (a copy of) its
+    result, or its error, instead of running it again.
+    '''
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def do(self, key, func, deadline=None):
+        '''
+        run func (or wait for the call already running for key). Waiting
+        for another caller's call gives up with DeadlineExceeded at
+        `deadline` (unix time).
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if deadline is None:
+                call.done.wait()
+            elif not call.done.wait(max(deadline - time.time(), 0)):
+                raise DeadlineExceeded('deadline exceeded waiting for the same request from another thread')
+            if call.error is not None:
+                raise call.error
+            # everyone gets their own copy, so nobody sees another callers changes
+            return copy.deepcopy(call.result)
+
+        result = None
+        try:
+            result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+            # nobody can start waiting now. Keep an untouched copy for the
+            # waiters to copy from, taken before the leader's result is handed
+            # back (and changed by whoever gets it).
+            if call.waiters and call.error is None:
+                call.result = copy.deepcopy(result)
+            call.done.set()
+
+        return result
+
+class CompletedResult(object):
+    '''
+    The result of a call that has already run, with the same get, ready,
+    wait and successful methods as a multiprocessing AsyncResult.
+    '''
+    def __init__(self, func, *args, **kwargs):
+        self._value = None
+        self._error = None
+        try:
+            self._value = func(*args, **kwargs)
+        except Exception as e:
+            self._error = e
+
+    def get(self, timeout=None):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def wait(self, timeout=None):
+        pass
+
+    def ready(self):
+        return True
+
+    def successful(self):
+        return self._error is None
+
+class NullLock(object):
+    '''
+    stands in for a lock when we don't need one
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
@@ -0,0 +1,19 @@
+from requests.exceptions import RequestException, Timeout
+
+class DeadlineExceeded(Timeout):
+    '''
+    The time budget set with NetflixClient.deadline (or a deadline argument)
+    ran out before the request could finish.
+    '''
+
+class QuotaExceeded(RequestException):
+    '''
+    A RequestScheduler rate limit (usually the per day one) won't let the
+    request out any time soon.
+    '''
+
+class OfflineAccessError(AttributeError):
+    '''
+    A field that hasn't been loaded was asked for while offline (see
+    NetflixClient.offline), so it would have meant a request.
+    '''
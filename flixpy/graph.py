@@ -0,0 +1,303 @@
+import os
+import struct
+
+from array import array
+from collections import deque
+
+from .utils import resource_id
+
+MAGIC = 'FLXGRPH1'
+
+# magic, number of titles, number of people, number of credits
+HEADER = struct.Struct('<8sIII')
+
+# the role of each credit
+CAST = 0
+DIRECTOR = 1
+
+def _person_key(person):
+    if isinstance(person, dict):
+        person = person['id']
+    return resource_id(getattr(person, 'url', person))
+
+def _credits(raw_title):
+    '''
+    (raw person, role) for everyone credited on a raw title
+    '''
+    for key, role in (('cast', CAST), ('directors', DIRECTOR)):
+        people = raw_title.get(key) or []
+        if isinstance(people, dict):
+            people = people.get(key) or []
+        for person in people:
+            yield person, role
+
+class CastGraph(object):
+    '''
+    Who worked on what, for a whole catalog, in a handful of flat arrays.
+
+    Titles and people are numbered from 0, and the credits are stored both
+    ways round in CSR form: title_people[title_offsets[t]:title_offsets[t + 1]]
+    are the people on title t (with their roles in credit_roles), and
+    person_titles[person_offsets[p]:person_offsets[p + 1]] the titles person p
+    is on, sorted. Nothing here goes to netflix, so co-stars, shared titles
+    and degrees of separation are all answered from memory.
+
+    Build one from titles with their cast and directors loaded:
+
+        graph = netflix.catalog.cast_graph()
+        graph = CastGraph.build(snapshot)
+        graph.save(path); graph = CastGraph.load(path)
+
+    Titles and people can be passed to the queries as objects, urls or ids.
+    Results are ids.
+    '''
+    def __init__(self, titles, people, names, title_offsets, title_people, credit_roles, person_offsets, person_titles):
+        self.titles = titles
+        self.people = people
+        self.names = names
+
+        self.title_offsets = title_offsets
+        self.title_people = title_people
+        self.credit_roles = credit_roles
+        self.person_offsets = person_offsets
+        self.person_titles = person_titles
+
+        self._title_index = dict((id, i) for i, id in enumerate(titles))
+        self._person_index = dict((id, i) for i, id in enumerate(people))
+
+    @classmethod
+    def build(cls, titles):
+        '''
+        build the graph from NetflixTitles or raw title json (anything
+        iterable, like a CatalogSnapshot or catalog.iter_streaming)
+        '''
+        title_ids = []
+        people = []
+        names = []
+        person_index = {}
+
+        title_offsets = array('i', [0])
+        title_people = array('i')
+        credit_roles = array('b')
+
+        for title in titles:
+            raw = getattr(title, 'data', title)
+
+            title_ids.append(resource_id(raw['id']))
+
+            seen = set()
+            for person, role in _credits(raw):
+                key = _person_key(person)
+                if key not in person_index:
+                    person_index[key] = len(people)
+                    people.append(key)
+                    names.append(person.get('name') if isinstance(person, dict) else None)
+
+                p = person_index[key]
+                if (p, role) in seen:
+                    continue
+                seen.add((p, role))
+
+                title_people.append(p)
+                credit_roles.append(role)
+
+            title_offsets.append(len(title_people))
+
+        # flip the credits round to get each persons titles (counting sort by person)
+        counts = array('i', [0]) * (len(people) + 1)
+        for p in title_people:
+            counts[p + 1] += 1
+
+        person_offsets = array('i', [0]) * (len(people) + 1)
+        for p in xrange(len(people)):
+            person_offsets[p + 1] = person_offsets[p] + counts[p + 1]
+
+        person_titles = array('i', [0]) * len(title_people)
+        filled = array('i', person_offsets[:-1]) if people else array('i')
+        for t in xrange(len(title_ids)):
+            for i in xrange(title_offsets[t], title_offsets[t + 1]):
+                p = title_people[i]
+                # someone who acted in and directed a title only needs it once
+                if filled[p] > person_offsets[p] and person_titles[filled[p] - 1] == t:
+                    continue
+                person_titles[filled[p]] = t
+                filled[p] += 1
+
+        # drop the slots left by people credited twice on a title
+        if any(filled[p] != person_offsets[p + 1] for p in xrange(len(people))):
+            compacted = array('i')
+            new_offsets = array('i', [0])
+            for p in xrange(len(people)):
+                compacted.extend(person_titles[person_offsets[p]:filled[p]])
+                new_offsets.append(len(compacted))
+            person_titles, person_offsets = compacted, new_offsets
+
+        return cls(title_ids, people, names, title_offsets, title_people, credit_roles, person_offsets, person_titles)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _title(self, title):
+        return self._title_index[resource_id(getattr(title, 'url', title))]
+
+    def _person(self, person):
+        return self._person_index[_person_key(person)]
+
+    def _people_on(self, t, roles=None):
+        start, end = self.title_offsets[t], self.title_offsets[t + 1]
+        if roles is None:
+            return self.title_people[start:end]
+        return [self.title_people[i] for i in xrange(start, end) if self.credit_roles[i] in roles]
+
+    def _titles_of(self, p):
+        return self.person_titles[self.person_offsets[p]:self.person_offsets[p + 1]]
+
+    # Queries
+
+    def credits(self, title, roles=None):
+        '''
+        the people on a title. roles: only people in these roles (CAST, DIRECTOR)
+        '''
+        return [self.people[p] for p in self._people_on(self._title(title), roles)]
+
+    def filmography(self, person):
+        return [self.titles[t] for t in self._titles_of(self._person(person))]
+
+    def costars(self, person, roles=(CAST,)):
+        '''
+        everyone who shares a title with `person`, counting only credits in
+        `roles` (None for cast and directors)
+        '''
+        p = self._person(person)
+
+        found = set()
+        for t in self._titles_of(p):
+            found.update(self._people_on(t, roles))
+        found.discard(p)
+
+        return [self.people[other] for other in sorted(found)]
+
+    def shared_titles(self, person, other):
+        '''
+        the titles both people are on (a merge of their sorted filmographies)
+        '''
+        a, b = self._titles_of(self._person(person)), self._titles_of(self._person(other))
+
+        shared = []
+        i = j = 0
+        while i < len(a) and j < len(b):
+            if a[i] == b[j]:
+                shared.append(self.titles[a[i]])
+                i += 1
+                j += 1
+            elif a[i] < b[j]:
+                i += 1
+            else:
+                j += 1
+
+        return shared
+
+    def path(self, person, other, max_degrees=6):
+        '''
+        The shortest chain of credits from one person to another, as
+        [person, title, person, title, ..., other], or None if they aren't
+        connected within max_degrees titles.
+        '''
+        start, goal = self._person(person), self._person(other)
+        if start == goal:
+            return [self.people[start]]
+
+        # came_from[p] is (previous person, title), -1 while not reached
+        came_from_person = array('i', [-1]) * len(self.people)
+        came_from_title = array('i', [-1]) * len(self.people)
+        seen_titles = bytearray(len(self.titles))
+
+        came_from_person[start] = start
+        frontier = deque([start])
+
+        for degree in xrange(max_degrees):
+            next_frontier = deque()
+            for p in frontier:
+                for t in self._titles_of(p):
+                    if seen_titles[t]:
+                        continue
+                    seen_titles[t] = 1
+
+                    for q in self._people_on(t):
+                        if came_from_person[q] != -1:
+                            continue
+                        came_from_person[q] = p
+                        came_from_title[q] = t
+
+                        if q == goal:
+                            chain = [self.people[q]]
+                            while q != start:
+                                chain[:0] = [self.people[came_from_person[q]], self.titles[came_from_title[q]]]
+                                q = came_from_person[q]
+                            return chain
+
+                        next_frontier.append(q)
+
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        return None
+
+    def degrees(self, person, other, max_degrees=6):
+        '''
+        how many titles apart two people are (1 if they share a title), or None
+        '''
+        chain = self.path(person, other, max_degrees)
+        if chain is None:
+            return None
+        return len(chain) // 2
+
+    # Saving
+
+    def save(self, path):
+        '''
+        write the graph to `path` (through a temp file, so readers never see half of one)
+        '''
+        tmp_path = '%s.tmp' % path
+
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, len(self.titles), len(self.people), len(self.title_people)))
+
+            for values in (self.title_offsets, self.title_people, self.credit_roles, self.person_offsets, self.person_titles):
+                values.tofile(out)
+
+            for strings in (self.titles, self.people, [name or u'' for name in self.names]):
+                blob = u'\n'.join(strings).encode('utf-8')
+                out.write(struct.pack('<Q', len(blob)))
+                out.write(blob)
+
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, title_count, people_count, credit_count = HEADER.unpack(f.read(HEADER.size))
+
+            if magic != MAGIC:
+                raise ValueError('%s is not a cast graph' % path)
+
+            arrays = []
+            for typecode, length in (('i', title_count + 1), ('i', credit_count), ('b', credit_count), ('i', people_count + 1), ('i', None)):
+                values = array(typecode)
+                if length is None:
+                    # person_titles, which is shorter than the credits if anyone had two roles on a title
+                    length = arrays[3][-1]
+                values.fromfile(f, length)
+                arrays.append(values)
+
+            strings = []
+            for count in (title_count, people_count, people_count):
+                length, = struct.unpack('<Q', f.read(8))
+                blob = f.read(length).decode('utf-8')
+                strings.append(blob.split(u'\n') if count else [])
+
+        titles, people, names = strings
+        names = [name or None for name in names]
+
+        return cls(titles, people, names, *arrays)
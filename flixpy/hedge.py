@@ -0,0 +1,107 @@
+import time
+import Queue
+import threading
+
+from collections import deque
+
+class Hedger(object):
+    '''
+    Hedged requests for GETs: if a request hasn't answered by the time most
+    requests have (the `percentile` latency of recent requests), a second
+    copy is sent and whichever answers first is used. This cuts off the slow
+    tail caused by a single slow api node, at the cost of a few extra
+    requests.
+
+    Nothing is hedged until `min_samples` latencies have been seen.
+    stats() reports how often we hedge and how often the hedge wins.
+    '''
+    def __init__(self, percentile=95, min_samples=20, window=1000, min_delay=0.01):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        '''
+        how long to wait before sending a hedge, or None if we don't know yet
+        '''
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        return max(self.min_delay, latencies[index])
+
+    def record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def run(self, func):
+        '''
+        call func, hedging it with a second call if it's slow
+        '''
+        self.requests += 1
+        delay = self.delay()
+        started = time.time()
+
+        if delay is None:
+            result = func()
+            self.record(time.time() - started)
+            return result
+
+        results = Queue.Queue()
+
+        def attempt(hedge):
+            try:
+                results.put((hedge, True, func()))
+            except Exception as e:
+                results.put((hedge, False, e))
+
+        self._start(attempt, False)
+        outstanding = 1
+
+        try:
+            first = results.get(timeout=delay)
+        except Queue.Empty:
+            self.hedged += 1
+            self._start(attempt, True)
+            outstanding += 1
+            first = results.get()
+        outstanding -= 1
+
+        # if the first answer was an error, give the other request a chance
+        hedge, ok, value = first
+        while not ok and outstanding:
+            hedge, ok, value = results.get()
+            outstanding -= 1
+
+        self.record(time.time() - started)
+
+        if not ok:
+            raise first[2]
+
+        if hedge:
+            self.hedge_wins += 1
+        return value
+
+    def _start(self, attempt, hedge):
+        thread = threading.Thread(target=attempt, args=(hedge,))
+        thread.daemon = True
+        thread.start()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'hedge_rate': float(self.hedged) / self.requests if self.requests else 0.0,
+            'win_rate': float(self.hedge_wins) / self.hedged if self.hedged else 0.0,
+            'delay': self.delay(),
+        }
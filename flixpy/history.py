@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+
+# how far (in seconds) to go back past our own clock on each sync, in case
+# netflix's clock is behind ours. Entries seen twice because of this are skipped.
+CLOCK_SKEW = 60
+
+class HistoryStore(object):
+    '''
+    A local, append only copy of a users rental history: one json entry per
+    line in `path`, and the sync checkpoint (the high water mark) next to it
+    in `path`.checkpoint.
+
+    Entries are only ever appended, and the checkpoint is only moved forward
+    after they're on disk, so a sync that dies half way just asks for the
+    same entries again next time (and duplicates of the last sync are skipped).
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = path + '.checkpoint'
+
+        self._lock = threading.Lock()
+        self._checkpoint = self._read_checkpoint()
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {'updated_min': None, 'count': 0, 'last_ids': []}
+
+    def _write_checkpoint(self, checkpoint):
+        # write a new file and move it over the old one, so it's never half written
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(temp_path, self.checkpoint_path)
+
+        self._checkpoint = checkpoint
+
+    @property
+    def high_water_mark(self):
+        '''
+        the updated_min (unix time) to ask for on the next sync, None if we never have
+        '''
+        return self._checkpoint['updated_min']
+
+    def __len__(self):
+        return self._checkpoint['count']
+
+    def __iter__(self):
+        return self.iter_entries()
+
+    def append(self, entries, high_water_mark):
+        '''
+        add entries to the end of the store and move the high water mark up.
+        Returns how many were new.
+        '''
+        with self._lock:
+            last_ids = set(self._checkpoint['last_ids'])
+            new = [entry for entry in entries if _entry_id(entry) not in last_ids]
+
+            if new:
+                with open(self.path, 'a') as f:
+                    for entry in new:
+                        f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            self._write_checkpoint({
+                'updated_min': high_water_mark,
+                'count': self._checkpoint['count'] + len(new),
+                # the next sync can return these again, updated_min being inclusive
+                'last_ids': [_entry_id(entry) for entry in entries] or self._checkpoint['last_ids'],
+            })
+
+            return len(new)
+
+    def iter_entries(self, start=0):
+        '''
+        yield the stored entries, oldest sync first, skipping the first `start`
+        '''
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            for i, line in enumerate(f):
+                if i < start:
+                    continue
+                # a sync that died mid write can leave a partial last line
+                if not line.endswith('\n'):
+                    break
+                yield json.loads(line)
+
+    def iter_titles(self, client):
+        '''
+        yield a NetflixTitle for every stored entry that has its title
+        '''
+        from .title import NetflixTitle
+
+        for entry in self.iter_entries():
+            if isinstance(entry.get('item'), dict):
+                yield NetflixTitle(entry['item'], client)
+
+def _entry_id(entry):
+    return entry.get('id') or json.dumps(entry, sort_keys=True)
+
+class HistorySync(object):
+    '''
+    Keeps a HistoryStore up to date with one of a users rental histories
+    (type None for all of it, or 'shipped', 'returned' or 'watched').
+
+    Each sync only asks netflix for entries updated since the last one
+    (updated_min), paging through them with start_index, so an hourly sync
+    is usually one small request.
+    '''
+    def __init__(self, user, store, history_type=None, page_size=100):
+        self.user = user
+        self.client = user.client
+        self.store = store if isinstance(store, HistoryStore) else HistoryStore(store)
+        self.history_type = history_type
+        self.page_size = page_size
+
+        self.url = '%s/rental_history' % user.url
+        if history_type:
+            self.url += '/%s' % history_type
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def sync(self):
+        '''
+        fetch everything new since the last sync into the store. Returns how many entries were added.
+        '''
+        started = int(time.time()) - CLOCK_SKEW
+        high_water_mark = self.store.high_water_mark
+
+        entries = []
+        start_index = 0
+        while True:
+            params = {'start_index': start_index, 'max_results': self.page_size, 'expand': '@title'}
+            if high_water_mark is not None:
+                params['updated_min'] = high_water_mark
+
+            page = self.client.get_resource(self.url, params=params)
+            items = _history_items(page)
+            entries.extend(items)
+
+            try:
+                total = int(page['meta']['number_of_results'])
+            except (KeyError, TypeError, ValueError):
+                total = None
+
+            start_index += len(items)
+            if len(items) < self.page_size or (total is not None and start_index >= total):
+                break
+
+        # netflix sends newest first, the store is oldest first
+        entries.reverse()
+
+        return self.store.append(entries, started)
+
+def _history_items(response):
+    items = response.get('rental_history') or []
+    if isinstance(items, dict):
+        items = items.get('rental_history_item') or []
+    if isinstance(items, dict):
+        items = [items]
+    return items
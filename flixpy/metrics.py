@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+
+from contextlib import contextmanager
+
+# upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# frames from files in here are ours, anything else is the code that called us
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'buckets': zip(self.buckets, self.counts),
+        }
+
+def _ours(frame):
+    return os.path.abspath(frame.f_code.co_filename).startswith(PACKAGE_DIR)
+
+def caller_location(frame=None):
+    '''
+    (filename, line number, function) of the first frame outside flixpy,
+    walking out from `frame` (our caller by default)
+    '''
+    frame = frame or sys._getframe(1)
+    while frame and _ours(frame):
+        frame = frame.f_back
+
+    if frame is None:
+        return None
+    return (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+
+def accessed_property(default, frame=None):
+    '''
+    the name of the flixpy function (usually a property) the calling code
+    used, e.g. 'is_hd' when is_hd -> _stream_info -> is_available -> get_info
+    '''
+    name = default
+    frame = frame or sys._getframe(1)
+    while frame and _ours(frame):
+        if frame.f_code.co_name not in ('get_info', '__getattr__', '_load_info'):
+            name = frame.f_code.co_name
+        frame = frame.f_back
+    return name
+
+class ClientMetrics(object):
+    '''
+    Counts and times everything a NetflixClient sends.
+
+    - a latency histogram per resource type (catalog_title, people, user, queue)
+    - how many lazy loads (get_info going to the network) each property caused,
+      and how many requests those loads took
+    - which line of calling code caused each lazy load (track_callers), to
+      find N+1 patterns
+
+    Attach one with `client.metrics = ClientMetrics()`. When client.metrics
+    is None nothing is recorded and none of this code runs.
+    '''
+    def __init__(self, track_callers=True):
+        self.track_callers = track_callers
+
+        self.latency = {}
+        self.statuses = {}
+        self.lazy_loads = {}
+        self.lazy_requests = {}
+        self.callers = {}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def lazy_load(self, key, frame):
+        '''
+        record a lazy load of `key` from `frame` (get_info's), and attribute
+        the requests made inside this block to it
+        '''
+        name = accessed_property(key, frame)
+        caller = caller_location(frame) if self.track_callers else None
+
+        with self._lock:
+            self.lazy_loads[name] = self.lazy_loads.get(name, 0) + 1
+            if caller:
+                self.callers[caller] = self.callers.get(caller, 0) + 1
+
+        previous = getattr(self._local, 'loading', None)
+        self._local.loading = name
+        try:
+            yield
+        finally:
+            self._local.loading = previous
+
+    def record_request(self, method, resource_type, elapsed, status):
+        loading = getattr(self._local, 'loading', None)
+
+        with self._lock:
+            if resource_type not in self.latency:
+                self.latency[resource_type] = Histogram()
+            self.latency[resource_type].observe(elapsed)
+
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+            if loading:
+                self.lazy_requests[loading] = self.lazy_requests.get(loading, 0) + 1
+
+    def report(self):
+        with self._lock:
+            return {
+                'latency': dict((kind, histogram.snapshot()) for kind, histogram in self.latency.items()),
+                'statuses': dict(self.statuses),
+                'lazy_loads': dict(self.lazy_loads),
+                'lazy_requests': dict(self.lazy_requests),
+                'callers': sorted(self.callers.items(), key=lambda item: -item[1]),
+            }
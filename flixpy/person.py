@@ -1,6 +1,10 @@
 from .base import NetflixBase
 
 class NetflixPerson(NetflixBase):
+    _identity_mapped = True
+
+    _fetchable = frozenset(['name', 'bio', 'filmography'])
+
     def __repr__(self):
         return self.full_name
 
@@ -8,7 +12,15 @@ class NetflixPerson(NetflixBase):
     def full_name(self):
         return self.name
 
-    def filmography(self):
+    def filmography(self, fields=None):
+        '''
+        fields: NetflixTitle properties (like 'synopsis' or 'is_hd') to load on every title up front
+        '''
         from .title import NetflixTitle
 
-        return [NetflixTitle(title, self.client) for title in self.get_info('filmography')]
+        titles = [NetflixTitle(title, self.client) for title in self.get_info('filmography')]
+
+        if fields:
+            self.client.hydrate(titles, NetflixTitle._fields_for(fields))
+
+        return titles
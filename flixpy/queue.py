@@ -0,0 +1,474 @@
+import time
+import threading
+
+from bisect import bisect_left
+from functools import wraps
+
+from requests.exceptions import HTTPError, RequestException
+
+from .concurrency import NullLock
+from .utils import title_number
+
+# what netflix answers with when the etag we send is out of date
+CONFLICT_STATUSES = (409, 412)
+
+# how many changed entries sync asks for at a time
+SYNC_PAGE_SIZE = 500
+
+def is_conflict(error):
+    return error.response is not None and error.response.status_code in CONFLICT_STATUSES
+
+def locked(method):
+    '''
+    run a NetflixQueue method while holding the queues lock
+    '''
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class QueueEntry(object):
+    def __init__(self, title_number, position, url=None):
+        self.title_number = title_number
+        self.position = position
+
+        # the entry's own url (used to delete it). We don't know this for
+        # titles we've just added until the next sync.
+        self.url = url
+
+    def __repr__(self):
+        return '<QueueEntry %s: %s>' % (self.position, self.title_number)
+
+class NetflixQueue(object):
+    '''
+    A local copy of one of a users queues ('instant' or 'disc').
+
+    Entries are indexed by title number and kept in position order. Adding
+    and removing titles is applied to the local copy, and the etag netflix
+    sends back is kept for the next change, so the queue is never downloaded
+    again just to make another change. Only when netflix rejects our etag
+    (someone else changed the queue) do we sync, and that sync only asks for
+    the entries that changed since we last looked.
+    '''
+    def __init__(self, user, queue='instant'):
+        self.user = user
+        self.client = user.client
+        self.queue = queue
+        self.url = '%s/queues/%s' % (user.url, queue)
+
+        self.etag = None
+        self.entries = []
+        self._by_title = {}
+
+        # when we last synced (unix time), None if we never have
+        self.synced_at = None
+
+        # how many times we've had to sync because our etag went stale
+        self.syncs = 0
+
+        # changes (and syncs) go one at a time if the client is shared between threads
+        self._lock = threading.RLock() if self.client.thread_safe else NullLock()
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self.entries)
+
+    def __iter__(self):
+        self._ensure_loaded()
+        return iter(list(self.entries))
+
+    def __contains__(self, title):
+        self._ensure_loaded()
+        return self._number(title) in self._by_title
+
+    def _number(self, title):
+        return title_number(getattr(title, 'url', title))
+
+    def _ensure_loaded(self):
+        if self.synced_at is None:
+            self.load()
+
+    def entry(self, title):
+        '''
+        the QueueEntry for a title (a NetflixTitle, url or title number), or None
+        '''
+        self._ensure_loaded()
+        return self._by_title.get(self._number(title))
+
+    def position(self, title):
+        entry = self.entry(title)
+        if entry:
+            return entry.position
+        return None
+
+    def title_numbers(self):
+        '''
+        the title numbers in the queue, in queue order
+        '''
+        self._ensure_loaded()
+        return [entry.title_number for entry in self.entries]
+
+    # Syncing
+
+    @locked
+    def load(self):
+        '''
+        download the whole queue, replacing the local copy
+        '''
+        started = time.time()
+
+        raw = self.user._raw_queue(self.queue)
+
+        self.entries = []
+        self._by_title = {}
+        for i, raw_entry in enumerate(raw.get('queue', [])):
+            self._upsert(raw_entry, i + 1)
+        self._renumber()
+
+        self._update_etag(raw)
+        self.synced_at = started
+
+    @locked
+    def sync(self):
+        '''
+        Bring the local copy up to date with netflix, asking only for the
+        entries changed since we last synced. If that doesn't account for
+        everything (entries removed elsewhere don't show up as changes) the
+        whole queue is loaded again.
+        '''
+        if self.synced_at is None:
+            return self.load()
+
+        started = time.time()
+
+        # page through the changes, there may be more than fit in one response
+        start_index = 0
+        while True:
+            changes = self.client.get_resource(self.url, params={
+                'updated_min': int(self.synced_at),
+                'start_index': start_index,
+                'max_results': SYNC_PAGE_SIZE,
+            })
+
+            entries = changes.get('queue', [])
+            for raw_entry in entries:
+                self._upsert(raw_entry)
+
+            try:
+                total = int(changes['meta']['number_of_results'])
+            except (KeyError, TypeError, ValueError):
+                total = None
+
+            start_index += len(entries)
+            if len(entries) < SYNC_PAGE_SIZE or (total is not None and start_index >= total):
+                break
+
+        self._renumber()
+
+        self._update_etag(changes)
+
+        try:
+            queue_length = int(changes['meta']['queue_length'])
+        except (KeyError, TypeError, ValueError):
+            queue_length = None
+
+        if queue_length is not None and queue_length != len(self.entries):
+            return self.load()
+
+        self.synced_at = started
+
+    def _upsert(self, raw_entry, default_position=None):
+        number = title_number(raw_entry['id'])
+        position = int(raw_entry.get('position') or default_position or len(self.entries) + 1)
+
+        self._remove_local(number)
+        self._insert_local(QueueEntry(number, position, raw_entry['id']))
+
+    def _update_etag(self, response):
+        try:
+            self.etag = response['meta']['etag']
+        except (KeyError, TypeError):
+            pass
+
+    # Local changes
+
+    def _renumber(self):
+        for i, entry in enumerate(self.entries):
+            entry.position = i + 1
+
+    def _remove_local(self, number):
+        entry = self._by_title.pop(number, None)
+        if entry:
+            self.entries.remove(entry)
+        return entry
+
+    def _insert_local(self, entry):
+        index = min(max(entry.position - 1, 0), len(self.entries))
+
+        self.entries.insert(index, entry)
+        self._by_title[entry.title_number] = entry
+
+    # Changes
+
+    def _send(self, request, retry=True):
+        '''
+        run a change against netflix with our etag. If the etag is stale we
+        sync and try once more (unless retry is False). Returns the response,
+        or None if netflix still rejects it.
+        '''
+        self._ensure_loaded()
+        try:
+            return request()
+        except HTTPError as e:
+            if not is_conflict(e):
+                raise
+
+        if not retry:
+            return None
+
+        self.syncs += 1
+        self.sync()
+        try:
+            return request()
+        except HTTPError as e:
+            if not is_conflict(e):
+                raise
+        return None
+
+    @locked
+    def add(self, title, position=None, retry=True):
+        '''
+        add a title to the queue (or move it, if its already there).
+        With no position it goes at the end.
+        '''
+        number = self._number(title)
+        url = getattr(title, 'url', title)
+
+        def request():
+            to = position or (len(self.entries) + (0 if number in self._by_title else 1))
+            return self.client.post_resource(self.url, data={
+                'etag': self.etag,
+                'title_ref': url,
+                'position': unicode(to),
+            })
+
+        response = self._send(request, retry)
+        if response is None:
+            return False
+
+        existing = self._remove_local(number)
+        self._insert_local(QueueEntry(number, position or len(self.entries) + 1, existing and existing.url))
+
+        # netflix may send back the entries it changed
+        for raw_entry in response.get('queue', []):
+            self._upsert(raw_entry)
+        self._renumber()
+
+        self._update_etag(response)
+
+        return True
+
+    @locked
+    def remove(self, title, retry=True):
+        '''
+        take a title out of the queue. Returns False if it wasn't in the queue.
+        '''
+        self._ensure_loaded()
+        number = self._number(title)
+
+        if number not in self._by_title:
+            return False
+
+        if not self._by_title[number].url:
+            # we added this one ourselves and don't know its url yet
+            self.sync()
+
+        def request():
+            entry = self._by_title.get(number)
+            if entry is None:
+                # a sync showed someone else already removed it
+                return {}
+            return self.client.delete_resource(entry.url, params={'etag': self.etag})
+
+        response = self._send(request, retry)
+        if response is None:
+            return False
+
+        self._remove_local(number)
+        self._renumber()
+
+        self._update_etag(response)
+
+        return True
+
+    @locked
+    def apply(self, operations):
+        '''
+        Run a batch of changes, in order. Each operation is a tuple of:
+            ('add', title) or ('add', title, position)
+            ('remove', title)
+
+        If netflix rejects our etag, the queue is synced once and that
+        operation retried. After that, any more etag conflicts just fail
+        their operation instead of syncing again, so a batch never costs more
+        than one conflict sync (syncs to look up the url of a title we added
+        ourselves don't count). Other errors (http, connection, timeouts) are
+        recorded against their operation and the batch carries on.
+
+        Every operation is checked before any are sent, so an unknown action
+        raises ValueError without changing the queue.
+
+        returns a QueueBatchResult.
+        '''
+        # check the whole batch before changing anything
+        operations = list(operations)
+        for operation in operations:
+            if operation[0] not in ('add', 'remove'):
+                raise ValueError('unknown queue operation %r' % operation[0])
+
+        self._ensure_loaded()
+
+        batch = QueueBatchResult()
+        started = time.time()
+        syncs = self.syncs
+
+        for operation in operations:
+            action, title = operation[0], operation[1]
+            position = operation[2] if len(operation) > 2 else None
+
+            retry = self.syncs == syncs
+            operation_started = time.time()
+            error = None
+
+            try:
+                if action == 'add':
+                    ok = self.add(title, position, retry=retry)
+                else:
+                    ok = self.remove(title, retry=retry)
+            except RequestException as e:
+                # http errors, connection errors and timeouts (deadlines too)
+                ok = False
+                error = e
+
+            batch.results.append(QueueOperationResult(action, title, position, ok, error, time.time() - operation_started))
+
+        batch.syncs = self.syncs - syncs
+        batch.elapsed = time.time() - started
+
+        return batch
+
+    @locked
+    def reorder(self, titles):
+        '''
+        Reorder the queue so `titles` (NetflixTitles or title urls) come in
+        the given order, moving as few of them as possible.
+
+        The longest run of titles that are already in the right relative
+        order stays put (the longest increasing subsequence of their target
+        positions), and every other title is moved to just after the title
+        that should come before it. Titles in the queue but not in `titles`
+        aren't moved.
+
+        returns the QueueBatchResult from applying the moves.
+        '''
+        self._ensure_loaded()
+
+        numbers = [self._number(title) for title in titles]
+        urls = dict(zip(numbers, [getattr(title, 'url', title) for title in titles]))
+
+        missing = [number for number in numbers if number not in self._by_title]
+        if missing:
+            raise ValueError('titles not in the queue: %s' % ', '.join(missing))
+
+        rank = dict((number, i) for i, number in enumerate(numbers))
+        order = [number for number in self.title_numbers() if number in rank]
+        keep = set(longest_increasing_run(order, rank))
+
+        # work the moves out on a copy of the queue, so each position is
+        # right for the queue as it will be when that move is made
+        simulated = self.title_numbers()
+        moves = []
+        for i, number in enumerate(numbers):
+            if number in keep:
+                continue
+
+            current = simulated.index(number)
+            if i == 0:
+                position = 1
+            else:
+                previous = simulated.index(numbers[i - 1])
+                position = previous + 1 if current < previous else previous + 2
+
+            simulated.remove(number)
+            simulated.insert(position - 1, number)
+            moves.append(('add', urls[number], position))
+
+        return self.apply(moves)
+
+def longest_increasing_run(items, rank):
+    '''
+    The longest subsequence of items whose ranks are increasing (patience
+    sorting, O(n log n)).
+    '''
+    tails = []          # index of the smallest last item for each run length
+    tail_ranks = []
+    previous = [None] * len(items)
+
+    for i, item in enumerate(items):
+        length = bisect_left(tail_ranks, rank[item])
+
+        if length:
+            previous[i] = tails[length - 1]
+
+        if length == len(tails):
+            tails.append(i)
+            tail_ranks.append(rank[item])
+        else:
+            tails[length] = i
+            tail_ranks[length] = rank[item]
+
+    run = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        run.append(items[i])
+        i = previous[i]
+
+    return run[::-1]
+
+class QueueOperationResult(object):
+    def __init__(self, action, title, position, ok, error, elapsed):
+        self.action = action
+        self.title = title
+        self.position = position
+
+        self.ok = ok
+        self.error = error
+
+        # seconds this operation took
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return '<QueueOperationResult %s %s: %s>' % (self.action, title_number(getattr(self.title, 'url', self.title)), 'ok' if self.ok else 'failed')
+
+class QueueBatchResult(object):
+    '''
+    what happened to each operation in a NetflixQueue.apply batch
+    '''
+    def __init__(self):
+        self.results = []
+
+        # seconds the whole batch took, and how many times an etag conflict made us sync
+        self.elapsed = 0
+        self.syncs = 0
+
+    def __iter__(self):
+        return iter(self.results)
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
@@ -0,0 +1,233 @@
+import time
+import bisect
+import itertools
+import threading
+
+from collections import deque
+
+from .exceptions import DeadlineExceeded, QuotaExceeded
+
+# request priorities, lower goes first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+# what netflix answers with when we're over a limit
+THROTTLED_STATUSES = (403, 429)
+
+class TokenBucket(object):
+    '''
+    Allows `rate` requests a second on average, with bursts of up to `capacity`.
+    '''
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        '''
+        seconds until there is a token to take
+        '''
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def remaining(self, now):
+        self._refill(now)
+        return self.tokens
+
+class RollingWindow(object):
+    '''
+    Allows at most `limit` requests in any `period` seconds, by remembering
+    when each of the last `limit` requests went out. Unlike a token bucket it
+    never lets a burst of up to the whole limit through and then earn it back.
+
+    This only knows about requests from this process (since it started).
+    '''
+    def __init__(self, limit, period=86400):
+        self.limit = int(limit)
+        self.period = period
+        self.sent = deque()
+
+    def _expire(self, now):
+        while self.sent and self.sent[0] <= now - self.period:
+            self.sent.popleft()
+
+    def delay(self, now):
+        self._expire(now)
+        if len(self.sent) < self.limit:
+            return 0
+        return self.sent[0] + self.period - now
+
+    def take(self, now):
+        self._expire(now)
+        self.sent.append(now)
+
+    def remaining(self, now):
+        self._expire(now)
+        return self.limit - len(self.sent)
+
+class RequestScheduler(object):
+    '''
+    Decides when a NetflixClient request may go out.
+
+    - Token buckets keep us under netflix's per second limits, and rolling
+      24 hour windows under the per day limits, both for the consumer key
+      and for each user.
+    - Requests wait their turn by priority, so INTERACTIVE lookups go ahead of
+      BACKGROUND crawls that are already waiting. A request that is only
+      waiting on its own limits (say its user is out of requests for today)
+      doesn't hold up the ones behind it.
+    - A request that would have to wait longer than max_wait seconds for its
+      limits, or past its deadline, fails right away with QuotaExceeded or
+      DeadlineExceeded.
+    - How many requests can be in flight at once is tuned as we go (AIMD): it
+      creeps up by one each round of requests that come back fast, and is
+      halved when netflix throttles us (403/429) or latency goes over
+      target_latency.
+
+    One scheduler can be shared by many clients with the same consumer key.
+    stats() returns the current limits and queue depth for monitoring.
+    '''
+    def __init__(self, per_second=4, per_day=None, user_per_second=None, user_per_day=5000,
+                 min_concurrency=1, max_concurrency=16, target_latency=2.0, max_wait=60):
+        self.limits = {
+            'consumer': (per_second, per_day),
+            'user': (user_per_second, user_per_day),
+        }
+
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_wait = max_wait
+        self.concurrency = float(min_concurrency)
+
+        self.in_flight = 0
+        self.throttled = 0
+
+        self._buckets = {}
+        # waiting tickets in the order they go, and the buckets each waits on
+        self._waiting = []
+        self._ticket_buckets = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _buckets_for(self, keys):
+        buckets = []
+        for kind, key in keys:
+            if (kind, key) not in self._buckets:
+                per_second, per_day = self.limits[kind]
+                self._buckets[(kind, key)] = [bucket for bucket in [
+                    per_second and TokenBucket(per_second),
+                    per_day and RollingWindow(per_day),
+                ] if bucket]
+            buckets.extend(self._buckets[(kind, key)])
+        return buckets
+
+    def _delay(self, buckets, now):
+        return max([bucket.delay(now) for bucket in buckets] + [0])
+
+    def _ready_ahead(self, ticket, now):
+        '''
+        is there a ticket ahead of this one that could go right now?
+        '''
+        for other in self._waiting:
+            if other == ticket:
+                return False
+            if not self._delay(self._ticket_buckets[other], now):
+                return True
+        return False
+
+    def acquire(self, priority=INTERACTIVE, keys=(), deadline=None):
+        '''
+        Wait until a request may go out. keys is a list of (kind, key) pairs
+        the request counts against, kind being 'consumer' or 'user'. If we
+        can't go before `deadline` (unix time), DeadlineExceeded is raised,
+        and if our limits won't allow it within max_wait, QuotaExceeded.
+
+        returns the start time to hand back to release.
+        '''
+        with self._condition:
+            ticket = (priority, next(self._counter))
+            buckets = self._buckets_for(keys)
+
+            bisect.insort(self._waiting, ticket)
+            self._ticket_buckets[ticket] = buckets
+
+            try:
+                while True:
+                    now = time.time()
+                    wait = self._delay(buckets, now)
+
+                    if wait > self.max_wait:
+                        raise QuotaExceeded('rate limit allows no request for %d seconds' % wait)
+                    if deadline is not None and now + wait >= deadline:
+                        raise DeadlineExceeded('deadline exceeded waiting for the scheduler')
+
+                    if not wait and self.in_flight < int(self.concurrency) and not self._ready_ahead(ticket, now):
+                        for bucket in buckets:
+                            bucket.take(now)
+                        self.in_flight += 1
+                        return now
+
+                    # wait for our limits to allow us, or to be woken by a
+                    # release or another ticket leaving the line
+                    timeout = wait or None
+                    if deadline is not None:
+                        timeout = min(timeout or deadline - now, deadline - now)
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting.remove(ticket)
+                del self._ticket_buckets[ticket]
+
+                # the next request in line may be able to go now
+                self._condition.notify_all()
+
+    def release(self, started, status=None):
+        '''
+        a request that acquire let out has finished, with this http status
+        (None if it didn't get a response)
+        '''
+        latency = time.time() - started
+
+        with self._condition:
+            self.in_flight -= 1
+
+            if status in THROTTLED_STATUSES or latency > self.target_latency:
+                if status in THROTTLED_STATUSES:
+                    self.throttled += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            elif status is not None:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            queued = {}
+            for priority, _ in self._waiting:
+                queued[priority] = queued.get(priority, 0) + 1
+
+            now = time.time()
+            tokens = {}
+            for (kind, key), buckets in self._buckets.items():
+                tokens['%s:%s' % (kind, key)] = [round(bucket.remaining(now), 2) for bucket in buckets]
+
+            return {
+                'concurrency': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'queued': len(self._waiting),
+                'queued_by_priority': queued,
+                'throttled': self.throttled,
+                'limits': dict(self.limits),
+                'tokens': tokens,
+            }
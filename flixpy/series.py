@@ -0,0 +1,94 @@
+from .utils import resource_id
+
+class SeriesNode(object):
+    '''
+    one title in a series tree: the series itself, a season, an episode or a disc
+    '''
+    __slots__ = ('url', 'raw', 'parent', 'ordinal', 'episodes', 'discs', 'seasons')
+
+    def __init__(self, raw, parent=None, ordinal=None):
+        self.url = raw['id']
+        self.raw = raw
+
+        # the node this one hangs off, and where it comes (from 1) among its parents children
+        self.parent = parent
+        self.ordinal = ordinal
+
+        self.seasons = []
+        self.episodes = []
+        self.discs = []
+
+    def __repr__(self):
+        return '<SeriesNode %s>' % resource_id(self.url)
+
+def _children(data, key):
+    '''
+    the list of titles expanded under `key`, which netflix sometimes wraps in another `key`
+    '''
+    children = data.get(key) or []
+    if isinstance(children, dict):
+        children = children.get(key) or []
+    return children
+
+class SeriesTree(object):
+    '''
+    A whole series (series -> seasons -> episodes and discs), loaded at
+    once and indexed by id, so a title's season, episode or disc number is
+    a dict lookup.
+
+    Loading takes one request for the series (with its seasons expanded)
+    and one per season (with its episodes and discs expanded), and the
+    season requests run at the same time. Each client keeps one tree per
+    series (NetflixClient.series_trees) and every title in the series uses it.
+    '''
+    def __init__(self, client, series_url):
+        self.client = client
+        self.url = series_url
+
+        self.root = None
+        self.nodes = {}
+
+    def load(self):
+        series = self.client.get_resource(self.url, expand='@seasons')['catalog_title']
+
+        root = SeriesNode(series)
+        nodes = {resource_id(root.url): root}
+
+        seasons = [SeriesNode(raw, root, i + 1) for i, raw in enumerate(_children(series, 'seasons'))]
+        root.seasons = seasons
+
+        if seasons:
+            responses = self.client.fetch_many([season.url for season in seasons], expand='@episodes,@discs')
+
+            for season, response in zip(seasons, responses):
+                data = response['catalog_title']
+                season.raw = dict(season.raw, **data)
+
+                season.episodes = [SeriesNode(raw, season, i + 1) for i, raw in enumerate(_children(data, 'episodes'))]
+                season.discs = [SeriesNode(raw, season, i + 1) for i, raw in enumerate(_children(data, 'discs'))]
+
+        for season in seasons:
+            nodes[resource_id(season.url)] = season
+            for node in season.episodes + season.discs:
+                nodes[resource_id(node.url)] = node
+
+        self.root = root
+        self.nodes = nodes
+
+        return self
+
+    def __contains__(self, url):
+        return resource_id(url) in self.nodes
+
+    def node(self, url):
+        return self.nodes.get(resource_id(url))
+
+    @property
+    def title(self):
+        title = self.root.raw['title']
+        if isinstance(title, dict):
+            return title['regular']
+        return title
+
+    def ids(self):
+        return list(self.nodes)
@@ -0,0 +1,51 @@
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.poolmanager import PoolManager
+
+class NetflixHTTPAdapter(HTTPAdapter):
+    '''
+    An HTTPAdapter that keeps a pool of keep-alive connections per host.
+
+    pool_connections: how many hosts we keep a connection pool for
+    pool_maxsize: how many connections we keep alive for each host
+    pool_block: if True, never open more than pool_maxsize connections to a
+                host; extra requests wait for a free connection instead
+    '''
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0):
+        # this needs to be set before the parent calls init_poolmanager
+        self._pool_block = pool_block
+
+        super(NetflixHTTPAdapter, self).__init__(pool_connections, pool_maxsize)
+
+        self.max_retries = max_retries
+
+    def __setstate__(self, state):
+        self._pool_block = state.pop('_pool_block', False)
+        super(NetflixHTTPAdapter, self).__setstate__(state)
+
+    def __getstate__(self):
+        state = super(NetflixHTTPAdapter, self).__getstate__()
+        state['_pool_block'] = self._pool_block
+        return state
+
+    def init_poolmanager(self, connections, maxsize):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+
+        self.poolmanager = PoolManager(num_pools=connections, maxsize=maxsize, block=self._pool_block)
+
+def create_session(pool_connections=10, pool_maxsize=10, pool_block=False, max_retries=0):
+    '''
+    Build a requests session backed by a keep-alive connection pool.
+
+    A session can be shared across many NetflixClient objects (one per user
+    token for example) by passing it in as the `session` argument, so they all
+    reuse the same open connections to the API.
+    '''
+    session = requests.Session()
+
+    adapter = NetflixHTTPAdapter(pool_connections, pool_maxsize, pool_block, max_retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
@@ -0,0 +1,254 @@
+import os
+import time
+import struct
+import threading
+
+from array import array
+
+from .concurrency import concurrent_map
+from .utils import resource_id
+
+MAGIC = 'FLXSIMS1'
+
+# magic, number of titles, number of edges
+HEADER = struct.Struct('<8sII')
+
+def _similar_items(response):
+    # the similars link either sends the list, or wraps it in similars_item
+    items = response.get('similars') or []
+    if isinstance(items, dict):
+        items = items.get('similars_item') or []
+    if isinstance(items, dict):
+        items = [items]
+    return items
+
+def _title_name(raw):
+    title = raw.get('title')
+    if isinstance(title, dict):
+        return title.get('regular')
+    return title
+
+class SimilarsIndex(object):
+    '''
+    The "similar titles" of lots of titles, crawled up front so
+    NetflixTitle.similar can walk them without any requests.
+
+    Titles are numbered from 0. For each one we keep its similars as an
+    array('i') of title numbers (in netflix's order, best match first) and
+    when they were fetched, so stale titles can be refreshed on their own.
+    Titles we've only seen as someone's similar have no array until they're
+    crawled themselves.
+
+        netflix.similars = SimilarsIndex(netflix)
+        netflix.similars.crawl(titles, depth=2)
+        title.similar(k_hops=2, limit=50)
+    '''
+    def __init__(self, client, max_workers=None):
+        self.client = client
+        self.max_workers = max_workers
+
+        self.ids = []
+        self.names = []
+        self.neighbors = []
+        self.fetched_at = array('d')
+
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, title):
+        i = self._index.get(resource_id(getattr(title, 'url', title)))
+        return i is not None and self.neighbors[i] is not None
+
+    def _node(self, id, name=None):
+        i = self._index.get(id)
+        if i is None:
+            i = self._index[id] = len(self.ids)
+            self.ids.append(id)
+            self.names.append(name)
+            self.neighbors.append(None)
+            self.fetched_at.append(0)
+        elif name and not self.names[i]:
+            self.names[i] = name
+        return i
+
+    def _url(self, i):
+        return 'http://%s%s' % (self.client.server, self.ids[i])
+
+    # Crawling
+
+    def _fetch(self, nodes, max_workers=None):
+        '''
+        download the similars of the given title numbers, bounded to max_workers at a time
+        '''
+        def fetch(i):
+            return self.client.get_resource('%s/similars' % self._url(i))
+
+        responses = concurrent_map(self.client._carry_context(fetch), nodes, max_workers or self.max_workers or self.client.max_workers)
+
+        now = time.time()
+        found = []
+        with self._lock:
+            for i, response in zip(nodes, responses):
+                similars = array('i')
+                for raw in _similar_items(response):
+                    j = self._node(resource_id(raw['id']), _title_name(raw))
+                    if j != i:
+                        similars.append(j)
+                        found.append(j)
+
+                self.neighbors[i] = similars
+                self.fetched_at[i] = now
+
+        return found
+
+    def crawl(self, titles, depth=1, max_workers=None):
+        '''
+        Fetch the similars of `titles` (NetflixTitles or urls), then of their
+        similars, and so on `depth` levels deep. Titles that are already in
+        the index aren't fetched again (see refresh).
+
+        returns how many titles were fetched.
+        '''
+        with self._lock:
+            frontier = []
+            for title in titles:
+                raw = getattr(title, 'data', None) or {}
+                frontier.append(self._node(resource_id(getattr(title, 'url', title)), _title_name(raw)))
+
+        fetched = 0
+        for level in xrange(depth):
+            frontier = sorted(set(i for i in frontier if self.neighbors[i] is None))
+            if not frontier:
+                break
+
+            fetched += len(frontier)
+            frontier = self._fetch(frontier, max_workers)
+
+        return fetched
+
+    def stale(self, max_age):
+        '''
+        the ids of crawled titles whose similars are older than max_age seconds
+        '''
+        cutoff = time.time() - max_age
+        return [self.ids[i] for i, at in enumerate(self.fetched_at) if at and at < cutoff]
+
+    def refresh(self, max_age, max_workers=None):
+        '''
+        fetch the similars again for titles older than max_age seconds. Returns how many were refreshed.
+        '''
+        cutoff = time.time() - max_age
+        nodes = [i for i, at in enumerate(self.fetched_at) if at and at < cutoff]
+        if nodes:
+            self._fetch(nodes, max_workers)
+        return len(nodes)
+
+    # Queries
+
+    def similar(self, title, k_hops=2, limit=50):
+        '''
+        Up to `limit` ids of titles within k_hops similars of `title`,
+        nearest first (and within a hop, in netflix's order). Never makes a
+        request: titles that haven't been crawled just have no similars.
+        '''
+        start = self._index.get(resource_id(getattr(title, 'url', title)))
+        if start is None:
+            return []
+
+        seen = set([start])
+        found = []
+        frontier = [start]
+
+        for hop in xrange(k_hops):
+            next_frontier = []
+            for i in frontier:
+                for j in self.neighbors[i] or ():
+                    if j in seen:
+                        continue
+                    seen.add(j)
+
+                    found.append(j)
+                    if len(found) >= limit:
+                        return [self.ids[k] for k in found]
+
+                    next_frontier.append(j)
+            frontier = next_frontier
+
+        return [self.ids[k] for k in found]
+
+    def name(self, id):
+        i = self._index.get(resource_id(id))
+        if i is None:
+            return None
+        return self.names[i]
+
+    # Saving
+
+    def save(self, path):
+        '''
+        write the index to `path` (through a temp file, so readers never see half of one)
+        '''
+        with self._lock:
+            offsets = array('i', [0])
+            edges = array('i')
+            for similars in self.neighbors:
+                # -1 marks a title that hasn't been crawled
+                if similars is None:
+                    offsets.append(-1)
+                else:
+                    edges.extend(similars)
+                    offsets.append(len(edges))
+
+            tmp_path = '%s.tmp' % path
+            with open(tmp_path, 'wb') as out:
+                out.write(HEADER.pack(MAGIC, len(self.ids), len(edges)))
+                offsets.tofile(out)
+                edges.tofile(out)
+                self.fetched_at.tofile(out)
+
+                for strings in (self.ids, [name or u'' for name in self.names]):
+                    blob = u'\n'.join(strings).encode('utf-8')
+                    out.write(struct.pack('<Q', len(blob)))
+                    out.write(blob)
+
+            os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, client, path, max_workers=None):
+        index = cls(client, max_workers)
+
+        with open(path, 'rb') as f:
+            magic, count, edge_count = HEADER.unpack(f.read(HEADER.size))
+
+            if magic != MAGIC:
+                raise ValueError('%s is not a similars index' % path)
+
+            offsets = array('i')
+            offsets.fromfile(f, count + 1)
+            edges = array('i')
+            edges.fromfile(f, edge_count)
+            index.fetched_at.fromfile(f, count)
+
+            strings = []
+            for i in xrange(2):
+                length, = struct.unpack('<Q', f.read(8))
+                blob = f.read(length).decode('utf-8')
+                strings.append(blob.split(u'\n') if count else [])
+
+        index.ids, names = strings
+        index.names = [name or None for name in names]
+        index._index = dict((id, i) for i, id in enumerate(index.ids))
+
+        start = 0
+        for i in xrange(count):
+            end = offsets[i + 1]
+            if end == -1:
+                index.neighbors.append(None)
+            else:
+                index.neighbors.append(edges[start:end])
+                start = end
+
+        return index
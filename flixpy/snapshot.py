@@ -0,0 +1,163 @@
+import os
+import json
+import mmap
+import struct
+
+from .utils import resource_id
+
+MAGIC = 'FLXSNAP1'
+
+# magic, number of titles, offset of the key area, offset of the index
+HEADER = struct.Struct('<8sIQQ')
+
+# key offset, key length, record offset, record length, name offset, name length
+ENTRY = struct.Struct('<QIQIQI')
+
+class CatalogSnapshot(object):
+    '''
+    A read only, on disk copy of the catalog.
+
+    The file is a list of json title records followed by a sorted index of
+    title ids. It is opened with mmap, so opening it is instant, lookups
+    are a binary search over the index, and every process that opens the same
+    file shares the same pages of memory.
+
+    Layout:
+        header
+        records     utf-8 json, one per title
+        keys        utf-8 title ids and lower cased titles (for search)
+        index       one ENTRY per title, sorted by title id
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self._keys_offset, self._index_offset = HEADER.unpack_from(self._map, 0)
+
+        if magic != MAGIC:
+            self.close()
+            raise ValueError('%s is not a catalog snapshot' % path)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, title_id):
+        return self._find(title_id) is not None
+
+    def __iter__(self):
+        '''
+        the raw json for every title, in id order
+        '''
+        for i in xrange(self.count):
+            yield self._record(self._entry(i))
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._map, self._index_offset + i * ENTRY.size)
+
+    def _record(self, entry):
+        return json.loads(self._map[entry[2]:entry[2] + entry[3]].decode('utf-8'))
+
+    def _find(self, title_id):
+        key = resource_id(title_id).encode('utf-8')
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            current = self._map[entry[0]:entry[0] + entry[1]]
+
+            if current == key:
+                return entry
+            elif current < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def get(self, title_id):
+        '''
+        get the raw json for a title by its id (full or partial url),
+        or None if it isn't in the snapshot
+        '''
+        entry = self._find(title_id)
+
+        if entry:
+            return self._record(entry)
+        return None
+
+    def search(self, term, start_index=None, max_results=None):
+        '''
+        get the raw json for every title whose name contains `term`
+        '''
+        # byte strings are utf-8, same as when they're sent to the api
+        if isinstance(term, str):
+            term = term.decode('utf-8')
+        term = term.lower().encode('utf-8')
+        start_index = start_index or 0
+
+        results = []
+        matched = 0
+        for i in xrange(self.count):
+            entry = self._entry(i)
+
+            if term in self._map[entry[4]:entry[4] + entry[5]]:
+                if matched >= start_index:
+                    results.append(self._record(entry))
+                    if max_results and len(results) >= max_results:
+                        break
+                matched += 1
+
+        return results
+
+    @classmethod
+    def write(cls, path, titles):
+        '''
+        Write a snapshot of `titles` (NetflixTitle objects or raw title json)
+        to `path`. The file is written next to `path` then moved into place, so
+        processes reading an old snapshot never see a half written file.
+
+        returns the number of titles written.
+        '''
+        tmp_path = '%s.tmp' % path
+        entries = []
+
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, 0, 0, 0))
+
+            for title in titles:
+                raw = getattr(title, 'data', title)
+
+                name = raw.get('title', u'')
+                if isinstance(name, dict):
+                    name = name.get('regular', u'')
+
+                record = json.dumps(raw, separators=(',', ':')).encode('utf-8')
+                entries.append([resource_id(raw['id']).encode('utf-8'), out.tell(), len(record), name.lower().encode('utf-8')])
+                out.write(record)
+
+            entries.sort()
+
+            keys_offset = out.tell()
+            for entry in entries:
+                key_offset = out.tell()
+                out.write(entry[0])
+                name_offset = out.tell()
+                out.write(entry[3])
+                entry[0], entry[3] = (key_offset, len(entry[0])), (name_offset, len(entry[3]))
+
+            index_offset = out.tell()
+            for (key_offset, key_len), record_offset, record_len, (name_offset, name_len) in entries:
+                out.write(ENTRY.pack(key_offset, key_len, record_offset, record_len, name_offset, name_len))
+
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, len(entries), keys_offset, index_offset))
+
+        os.rename(tmp_path, path)
+
+        return len(entries)
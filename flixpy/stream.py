@@ -0,0 +1,97 @@
+import json
+
+WHITESPACE = ' \t\n\r'
+
+class _ChunkBuffer(object):
+    '''
+    Holds the part of a chunked json body that hasn't been parsed yet.
+    Only the unparsed tail is kept around, so memory stays bounded by the
+    size of the biggest single value we decode.
+    '''
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = u''
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        if self.exhausted:
+            return False
+
+        # throw away everything we've already parsed before growing the buffer
+        if self.pos:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+
+        for chunk in self.chunks:
+            if chunk:
+                self.text += chunk
+                return True
+
+        self.exhausted = True
+        return False
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.read_more():
+                return
+
+    def peek(self):
+        self.skip_whitespace()
+        if self.pos >= len(self.text):
+            raise ValueError('unexpected end of json stream')
+        return self.text[self.pos]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('expected %r at position %s of json stream' % (char, self.pos))
+        self.pos += 1
+
+    def decode(self, decoder):
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                # the value is probably split across chunks
+                if not self.read_more():
+                    raise
+                continue
+
+            # a number at the very end of the buffer might continue in the next chunk
+            if end == len(self.text) and self.read_more():
+                continue
+
+            self.pos = end
+            return value
+
+def iter_json_array(chunks, key):
+    '''
+    Incrementally parse a json object that arrives in chunks (unicode strings),
+    yielding the items of the array stored under `key` one at a time.
+
+    Any other top level keys are parsed and thrown away.
+    '''
+    decoder = json.JSONDecoder()
+    buf = _ChunkBuffer(chunks)
+
+    buf.expect('{')
+
+    while buf.peek() != '}':
+        name = buf.decode(decoder)
+        buf.expect(':')
+
+        if name == key and buf.peek() == '[':
+            buf.expect('[')
+            while buf.peek() != ']':
+                yield buf.decode(decoder)
+                if buf.peek() == ',':
+                    buf.pos += 1
+            buf.expect(']')
+        else:
+            buf.decode(decoder)
+
+        if buf.peek() == ',':
+            buf.pos += 1
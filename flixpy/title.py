@@ -1,11 +1,37 @@
 from datetime import timedelta
 
-from requests.exceptions import HTTPError
-
 from .base import NetflixBase
+from .exceptions import OfflineAccessError
 from .person import NetflixPerson
+from .series import SeriesTree
+from .utils import resource_id
 
 class NetflixTitle(NetflixBase):
+    _identity_mapped = True
+
+    _link_keys = {
+        'delivery_formats': 'format_availability',
+    }
+
+    _fetchable = frozenset([
+        'title', 'synopsis', 'delivery_formats', 'directors', 'cast', 'similars',
+        'box_art', 'awards', 'languages_and_audio', 'screen_formats', 'bonus_materials',
+        'release_year', 'average_rating', 'genres', 'seasons', 'episodes', 'discs',
+    ])
+
+    _property_fields = {
+        'title': 'title',
+        'synopsis': 'synopsis',
+        'is_available': 'delivery_formats',
+        'mpaa_rating': 'delivery_formats',
+        'tv_rating': 'delivery_formats',
+        'is_hd': 'delivery_formats',
+        'length': 'delivery_formats',
+        'watch_link': 'delivery_formats',
+        'directors': 'directors',
+        'cast': 'cast',
+    }
+
     @property
     def title(self):
         if isinstance(self.data['title'], dict):
@@ -70,94 +96,161 @@ class NetflixTitle(NetflixBase):
         return [NetflixPerson(person, self.client) for person in self.get_info('cast')]
 
     #####################
-    #  Queue Functions  #
+    #  Series Functions #
     #####################
 
-    def remove_from_queue(self, second_try=False):
-        if self.client.instant_queue:
-            for item in self.client.instant_queue['queue']:
-                if str(self.id) in item['id']:
-                    try:
-                        self.client.instant_queue = self.client.delete_resource(item['id'], params={'etag': self.client.instant_queue['meta']['etag']})
-                        return True
-                    except HTTPError:
-                        # the queue is probably outdated, update and try again
-                        if not second_try:
-                            self.client.instant_queue = self.client.user.instant_queue(raw=True)
-                            self.client.instant_queue = self.remove_from_queue(second_try=True)
-        else:
-            self.client.instant_queue = self.client.user.instant_queue(raw=True)
-            self.remove_from_queue()
-        return False
+    def _series_url(self):
+        if self.type == 'series':
+            return self.url
 
-    def add_to_queue(self, position=None, second_try=False):
-        if self.client.instant_queue:
-            try:
-                if not position:
-                    # if we don't have a position, put this item at the end
-                    position = int(self.client.instant_queue['meta']['queue_length']) + 1
-                self.client.post_resource('/users/%s/queues/instant' % self.client.user.id, data={
-                    'etag': self.client.instant_queue['meta']['etag'],
-                    'title_ref': self.url,
-                    'position': unicode(position)
-                })
-
-                self.client.instant_queue = self.client.user.instant_queue(raw=True)
-
-                return True
-            except HTTPError:
-                if not second_try:
-                    self.client.instant_queue = self.client.user.instant_queue(raw=True)
-                    self.add_to_queue(position, second_try=True)
-        else:
-            self.client.instant_queue = self.client.user.instant_queue(raw=True)
-            self.add_to_queue(position)
+        if not self.meta:
+            self._set_resource(self.client.get_resource(self.url))
 
-        return False
+        return self._link('series')
 
-'''
+    def series_tree(self):
+        '''
+        The SeriesTree for the series this title is in (None for movies).
+        The whole series is loaded the first time any title in it asks, and
+        shared by all of them after that.
+        '''
+        if self.type == 'movie':
+            return None
+
+        client = self.client
+        with client._lock:
+            tree = client.series_trees.get(resource_id(self.url))
+        if tree:
+            return tree
+
+        if self.is_offline():
+            raise OfflineAccessError("%s hasn't loaded its series, and is offline" % self.url)
+
+        series_url = self._series_url()
+        if not series_url:
+            return None
+
+        tree = SeriesTree(client, series_url).load()
+
+        with client._lock:
+            # another thread may have loaded it while we were
+            tree = client.series_trees.get(resource_id(series_url), tree)
+            for id in tree.ids():
+                client.series_trees[id] = tree
+
+        return tree
+
+    def _series_node(self):
+        tree = self.series_tree()
+        if tree:
+            return tree.node(self.url)
+        return None
+
+    def series(self):
+        tree = self.series_tree()
+        if tree:
+            return NetflixTitle(tree.root.raw, self.client)
+        return None
+
+    def season(self):
+        node = self._series_node()
+        if node and node.parent and self.type in ('program', 'disc'):
+            return NetflixTitle(node.parent.raw, self.client)
+        return None
+
+    def seasons(self):
+        tree = self.series_tree()
+        if tree:
+            return [NetflixTitle(season.raw, self.client) for season in tree.root.seasons]
+        return []
+
+    def episodes(self):
+        node = self._series_node()
+        if node:
+            if self.type == 'series':
+                return [NetflixTitle(episode.raw, self.client) for season in node.seasons for episode in season.episodes]
+            return [NetflixTitle(episode.raw, self.client) for episode in node.episodes]
+        return []
+
+    def discs(self):
+        node = self._series_node()
+        if node:
+            return [NetflixTitle(disc.raw, self.client) for disc in node.discs]
+        return []
 
     @property
     def series_title(self):
         if self.type == 'series':
             return self.title
         elif self.type != 'movie':
-            return self.series().title
+            tree = self.series_tree()
+            if tree:
+                return tree.title
         return None
 
     @property
     def season_number(self):
-        try:
-            i = 1
-            for season in self.series().seasons():
-                if self.id == season.id:
-                    return i
-                else:
-                    i += 1
-        except TypeError:
+        node = self._series_node()
+        if node is None or node.parent is None:
             return None
+        if self.type == 'season':
+            return node.ordinal
+        return node.parent.ordinal
 
     @property
     def episode_title(self):
-        try:
-            return self.info['title']['episode_short']
-        except KeyError:
-            return None
+        title = self.data['title']
+        if isinstance(title, dict):
+            return title.get('episode_short')
+        return None
 
     @property
     def episode_number(self):
-        try:
-            i = 1
-            for episode in self.season().episodes():
-                if self.id == episode.id:
-                    return i
-                else:
-                    i += 1
-        except TypeError:
+        if self.type != 'program':
             return None
+        node = self._series_node()
+        if node:
+            return node.ordinal
+        return None
 
+    @property
+    def disc_number(self):
+        if self.type != 'disc':
+            return None
+        node = self._series_node()
+        if node:
+            return node.ordinal
+        return None
 
+    def similar(self, k_hops=2, limit=50):
+        '''
+        Titles like this one, from the clients SimilarsIndex (see
+        flixpy.similars), nearest first. This never makes a request: if the
+        index hasn't crawled this title there are no similars.
+        '''
+        index = self.client.similars
+        if index is None:
+            return []
 
+        titles = []
+        for id in index.similar(self, k_hops, limit):
+            raw = {'id': 'http://%s%s' % (self.client.server, id)}
+            if index.name(id):
+                raw['title'] = index.name(id)
+            titles.append(NetflixTitle(raw, self.client))
+        return titles
+
+    #####################
+    #  Queue Functions  #
+    #####################
+
+    def remove_from_queue(self):
+        return self.client.user.queue.remove(self)
+
+    def add_to_queue(self, position=None):
+        return self.client.user.queue.add(self, position)
+
+'''
 
     @property
     def tv_rating(self):
@@ -196,18 +289,6 @@ class NetflixTitle(NetflixBase):
         else:
             return []
 
-    def similar_titles(self):
-        raw_sim = self.get_info('similars')
-        if raw_sim:
-            raw_sim = raw_sim['similars']['similars_item']
-
-            if isinstance(raw_sim, list):
-                return [NetflixTitle(title,self.client) for title in raw_sim]
-            else:
-                return NetflixTitle(raw_sim, self.client)
-        else:
-            return []
-
     def user_state(self):
         user = self.client.user
 
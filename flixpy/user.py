@@ -1,20 +1,45 @@
+import re
+import time
+
+from itertools import izip
+from urllib import quote
+
 from .base import NetflixBase
 from .title import NetflixTitle
+from .concurrency import concurrent_map, iter_prefetched
+from .history import HistorySync
+from .queue import NetflixQueue
+from .utils import resource_id, title_number
+
+# keep ratings urls under this many characters, leaving room for the oauth params
+MAX_URL_LENGTH = 2048
+OAUTH_PARAMS_LENGTH = 400
 
 class NetflixUser(NetflixBase):
-    def __init__(self, client, user_id=None):
+    _fetchable = frozenset([
+        'first_name', 'last_name', 'nickname', 'preferred_formats', 'recommendations',
+        'queues', 'rental_history', 'title_states', 'ratings', 'feeds',
+    ])
+
+    def __init__(self, client, user_id=None, auth=None):
+        '''
+        auth: sign the requests that load the user with this instead of the clients credentials
+        '''
         if user_id:
             self.user_id = '/users/%s' % user_id
         else:
             # if we don't have a user id, we need to request it from netflix
             # This is an extra request, so best to save it!
-            result = client.get_resource('/users/current')
+            result = client.get_resource('/users/current', auth=auth)
             self.user_id = result.values()[0]
 
-        raw_json = client.get_resource(self.user_id)
+        raw_json = client.get_resource(self.user_id, auth=auth)
 
         super(NetflixUser, self).__init__(raw_json['user'], client)
 
+        # title id -> (expires, ratings), see ratings()
+        self._ratings = {}
+
     def __repr__(self):
         return self.full_name
 
@@ -26,40 +51,254 @@ class NetflixUser(NetflixBase):
     def url(self):
         return '/users/' + self.id
 
+    @property
+    def queue(self):
+        '''
+        the users instant queue, as a NetflixQueue. Use this to add, remove and
+        look up titles without downloading the queue every time.
+        '''
+        with self.client._lock:
+            if '_queue' not in self.__dict__:
+                self._queue = NetflixQueue(self, 'instant')
+        return self._queue
+
     @property
     def full_name(self):
         return self.first_name + " %s" % self.last_name
 
-    def recommendations(self):
+    def recommendations(self, fields=None):
+        '''
+        fields: NetflixTitle properties (like 'synopsis' or 'is_hd') to load on every title up front
+        '''
+        keys = NetflixTitle._fields_for(fields or [])
+
         # right now we always get 200 recommendations, which as far as I can tell right now is the max
-        return [NetflixTitle(title, self.client) for title in self.get_info('recommendations', params={'max_results': 200})]
+        params = {'max_results': 200}
+        if keys:
+            params['expand'] = NetflixTitle._expand_for(keys)
+
+        titles = [NetflixTitle(title, self.client) for title in self.get_info('recommendations', params=params)]
+
+        return self.client.hydrate(titles, keys)
+
+    def recommendations_async(self, fields=None):
+        '''
+        like recommendations, but returns an AsyncResult (right away with an AsyncNetflixClient, which runs recommendations in the background)
+        '''
+        return self.client.submit(self.recommendations, fields)
 
-    def instant_queue(self, raw=False):
+    def ratings(self, titles, ttl=15 * 60, max_workers=None):
+        '''
+        The users ratings for a lot of titles (NetflixTitles or urls) at once,
+        as a dict of title id -> {'average': ..., 'predicted': ..., 'user': ...}
+        ('user' only if they've rated it, None for titles netflix has no
+        ratings for).
+
+        The titles are split into as few requests as fit under netflix's url
+        length limit, and those requests run up to max_workers at a time.
+        Ratings are kept for `ttl` seconds, so asking again only requests
+        titles we don't have (or that have expired).
+        '''
+        urls = {}
+        for title in titles:
+            url = getattr(title, 'url', title)
+            if not re.match('http', url):
+                url = 'http://%s%s' % (self.client.server, url)
+            urls[resource_id(url)] = url
+
+        now = time.time()
+        result = {}
+        missing = []
+        with self.client._lock:
+            for id, url in urls.items():
+                cached = self._ratings.get(id)
+                if cached and cached[0] > now:
+                    result[id] = cached[1]
+                else:
+                    missing.append(id)
+
+        if not missing:
+            return result
+
+        ratings_url = '%s/ratings/title' % self.url
+
+        def fetch(ids):
+            return self.client.get_resource(ratings_url, params={'title_refs': ','.join(urls[id] for id in ids)})
+
+        chunks = self._ratings_chunks(missing, urls, len(self.client._build_request(ratings_url)[0]))
+        responses = concurrent_map(self.client._carry_context(fetch), chunks, max_workers or self.client.max_workers)
+
+        fetched = dict((id, None) for id in missing)
+        by_number = dict((title_number(id), id) for id in missing)
+        for response in responses:
+            for item in _ratings_items(response):
+                title = item.get('item') or item.get('catalog_title') or {}
+                id = by_number.get(title_number(title.get('id') or item['id']))
+                if id is None:
+                    continue
+
+                ratings = {
+                    'average': item.get('average_rating'),
+                    'predicted': item.get('predicted_rating'),
+                }
+                if 'user_rating' in item:
+                    ratings['user'] = item['user_rating']
+                fetched[id] = ratings
+
+        expires = time.time() + ttl
+        with self.client._lock:
+            for id, ratings in fetched.items():
+                self._ratings[id] = (expires, ratings)
+
+        result.update(fetched)
+        return result
+
+    def _ratings_chunks(self, ids, urls, base_length):
+        '''
+        split ids into chunks whose quoted title_refs fit in a ratings url
+        '''
+        budget = MAX_URL_LENGTH - OAUTH_PARAMS_LENGTH - base_length - len('?title_refs=')
+
+        chunks = []
+        chunk, length = [], 0
+        for id in ids:
+            # each ref is quoted, and all but the first need a quoted comma (%2C)
+            ref_length = len(quote(urls[id], '')) + (3 if chunk else 0)
+
+            if chunk and length + ref_length > budget:
+                chunks.append(chunk)
+                chunk, length = [], 0
+                ref_length -= 3
+
+            chunk.append(id)
+            length += ref_length
+
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    def invalidate_ratings(self, titles=None):
+        '''
+        forget cached ratings for some titles (or all of them), say after rating one
+        '''
+        with self.client._lock:
+            if titles is None:
+                self._ratings.clear()
+            for title in titles or []:
+                self._ratings.pop(resource_id(getattr(title, 'url', title)), None)
+
+    def history_sync(self, path, history_type=None, page_size=100):
+        '''
+        A HistorySync that keeps a local copy of this users rental history
+        (or just one type of it: 'shipped', 'returned' or 'watched') in the
+        file at `path`. Use one file per user and type.
+
+            history = user.history_sync('history/%s.jsonl' % user.id)
+            history.sync()
+            for entry in history:
+                ...
+        '''
+        return HistorySync(self, path, history_type, page_size)
+
+    def instant_queue(self, raw=False, fields=None, page_size=100, max_workers=None):
         '''
         This is a quick link to the users instant queue. You can also get This
         by calling the `queue_list` resource, then calling the queue
         but thats an extra request.
 
         the resource can be retrieved with raw to get data used for deleting items
-        '''
-
-        if raw:
-            expand = None
-        else:
-            expand = "@title"
 
-        item_list = self.client.get_resource('%s/queues/instant' % self.url, expand=expand, params={
-            'max_results': 500
-        })
+        fields: NetflixTitle properties (like 'synopsis' or 'is_hd') to load on every title up front
 
+        The queue is downloaded in pages of `page_size`, up to `max_workers` at
+        a time (see iter_queue).
+        '''
         if raw:
-            return item_list
+            return self._raw_queue('instant', page_size, max_workers)
+
+        return list(self.iter_queue('instant', fields=fields, page_size=page_size, max_workers=max_workers))
 
-        return [NetflixTitle(title['item'], self.client) for title in item_list['queue']]
+    def instant_queue_async(self, raw=False, fields=None):
+        '''
+        like instant_queue, but returns an AsyncResult (right away with an AsyncNetflixClient, which runs instant_queue in the background)
+        '''
+        return self.client.submit(self.instant_queue, raw, fields)
 
-    def disc_queue(self):
+    def disc_queue(self, fields=None, page_size=100, max_workers=None):
         # like the above, but for DVD's
         # No idea if this works, as I don't have an accout to test it with
-        item_list = self.client.get_resource('%s/queues/disc' % self.url, expand="@title")
+        return list(self.iter_queue('disc', fields=fields, page_size=page_size, max_workers=max_workers))
+
+    def _iter_queue_pages(self, queue, expand=None, page_size=100, max_workers=None):
+        '''
+        yields (start_index, page) for every page of a queue. The first page
+        tells us how long the queue is, the rest are fetched concurrently.
+        '''
+        url = '%s/queues/%s' % (self.url, queue)
+
+        def fetch_page(start_index):
+            return self.client.get_resource(url, expand=expand, params={
+                'start_index': start_index,
+                'max_results': page_size,
+            })
+
+        first_page = fetch_page(0)
+        yield 0, first_page
+
+        try:
+            total = int(first_page['meta']['queue_length'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        start_indexes = xrange(page_size, total, page_size)
+        for start_index, page in izip(start_indexes, iter_prefetched(self.client._carry_context(fetch_page), start_indexes, max_workers or self.client.max_workers)):
+            yield start_index, page
+
+    def iter_queue(self, queue='instant', ids_only=False, fields=None, page_size=100, max_workers=None):
+        '''
+        Yields every title in one of the users queues ('instant' or 'disc') as
+        NetflixTitles, in queue order. Pages come down concurrently and titles
+        are handed over as soon as their page arrives, so this works for
+        queues of any length.
+
+        ids_only: skip downloading the titles and yield (title number, position)
+                  pairs instead. This is much cheaper for big queues.
+        fields: NetflixTitle properties (like 'synopsis' or 'is_hd') to load on every title up front
+        '''
+        keys = NetflixTitle._fields_for(fields or [])
+
+        pages = self._iter_queue_pages(queue, None if ids_only else '@title', page_size, max_workers)
+
+        for start_index, page in pages:
+            entries = page.get('queue', [])
+
+            if ids_only:
+                for i, entry in enumerate(entries):
+                    yield title_number(entry['id']), int(entry.get('position') or start_index + i + 1)
+            else:
+                titles = [NetflixTitle(entry['item'], self.client) for entry in entries]
+                for title in self.client.hydrate(titles, keys):
+                    yield title
+
+    def _raw_queue(self, queue, page_size=100, max_workers=None):
+        '''
+        the raw json for a whole queue, with the entries from every page
+        '''
+        raw = None
+        for start_index, page in self._iter_queue_pages(queue, None, page_size, max_workers):
+            if raw is None:
+                raw = page
+            else:
+                raw['queue'].extend(page.get('queue', []))
+
+        return raw
 
-        return [NetflixTitle(title['item'], self.client) for title in item_list['queue']]
+def _ratings_items(response):
+    # netflix wraps the list of ratings differently depending on the version
+    items = response.get('ratings') or []
+    if isinstance(items, dict):
+        items = items.get('ratings_item') or []
+    if isinstance(items, dict):
+        items = [items]
+    return items
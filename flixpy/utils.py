@@ -0,0 +1,51 @@
+import re
+
+from urlparse import urlsplit
+
+def resource_id(url):
+    '''
+    Turn a full resource url into the partial url netflix uses as an id:
+        http://api-public.netflix.com/catalog/titles/movies/60021896 -> /catalog/titles/movies/60021896
+    Partial urls are returned as is.
+    '''
+    if re.match('http', url):
+        parts = urlsplit(url)
+        if parts.query:
+            return '%s?%s' % (parts.path, parts.query)
+        return parts.path
+    return url
+
+def resource_type(url):
+    '''
+    Work out what kind of resource a url points at:
+        catalog_title, people, queue, user (or other)
+    '''
+    path = resource_id(url).split('?')[0]
+
+    if path.startswith('/catalog/titles'):
+        return 'catalog_title'
+    elif path.startswith('/catalog/people'):
+        return 'people'
+    elif path.startswith('/users'):
+        if '/queues' in path:
+            return 'queue'
+        return 'user'
+    return 'other'
+
+def request_key(url, params=None):
+    '''
+    A hashable key that is the same for any two requests for the same
+    resource, no matter how the url was written or the params were ordered.
+    '''
+    path = resource_id(url)
+
+    if params:
+        return (path, tuple(sorted((unicode(key), unicode(value)) for key, value in params.items())))
+    return (path, ())
+
+def title_number(url):
+    '''
+    The number at the end of a title (or queue entry) url:
+        /catalog/titles/movies/60021896 -> 60021896
+    '''
+    return resource_id(url).split('?')[0].rstrip('/').split('/')[-1]